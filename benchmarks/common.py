@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""压测脚本共用的工具函数"""
+import json
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def resolve_baseline(name: str) -> Path:
+    """基线既可以是文件路径, 也可以是 benchmarks/baselines 下的名称"""
+    path = Path(name)
+    if path.suffix == ".json" or path.exists():
+        return path
+    return BASELINE_DIR / f"{name}.json"
+
+
+def save_report(report: dict, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def compare_reports(current: dict, baseline_path: Path, keys: tuple[str, ...]) -> None:
+    """打印与基线结果的相对变化(正数表示数值变大)"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n对比基线 {baseline['meta'].get('commit')} -> {current['meta'].get('commit')}")
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            print(f"{name:<32} (基线中不存在)")
+            continue
+        parts = []
+        for key in keys:
+            if before.get(key):
+                delta = (now[key] - before[key]) / before[key] * 100
+                parts.append(f"{key} {delta:+.1f}%")
+        print(f"{name:<32} " + "  ".join(parts))
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#lmoadll_bl platform
+#
+#@copyright  Copyright (c) 2025 lmoadll_bl team
+#@license  GNU General Public License 3.0
+"""
+认证 API 端到端压测
+
+在进程内启动 lmoadll_bl.app(ASGI 测试客户端, 不经过网络), 使用临时 SQLite
+数据库并预置用户, 以固定并发驱动以下接口并输出吞吐量与 p50/p95/p99 延迟:
+
+    POST /api/v1/auth/login
+    GET  /api/v1/auth/user/profile
+    GET  /api/v1/auth/users?name=...
+    POST /api/v1/auth/regter
+
+用法:
+    python benchmarks/http_bench.py --concurrency 8 --requests 200 --output bench.json
+    python benchmarks/http_bench.py --compare bench.json       # 与上次结果对比
+
+也可以通过环境变量 DATABASE_URL 指向一个 PostgreSQL 测试库代替 SQLite.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from benchmarks.common import git_commit, percentile, resolve_baseline, save_report, compare_reports  # noqa: E402
+
+SEED_PASSWORD = "benchPass123"
+SCENARIOS = ("login", "profile", "users", "register")
+
+
+def setup_database(seed_users: int) -> None:
+    """建表并写入基准用户(密码哈希只计算一次, 所有用户共享)"""
+    from magic.utils.db.connection import Base, engine, SessionLocal
+    from magic.utils.Argon2Password import hashPassword
+    from magic.models.user import User
+    import magic.models.rbac  # noqa: F401 注册 RBAC 表
+    import magic.models.authSession  # noqa: F401 注册刷新会话和签名密钥表
+
+    Base.metadata.create_all(bind=engine)
+    passwordHash = hashPassword(SEED_PASSWORD)
+    now = int(time.time())
+    with SessionLocal() as db:
+        if db.query(User).count() == 0:
+            db.add_all([
+                User(name=f"bench{i}", mail=f"bench{i}@example.com", password=passwordHash,
+                     url="127.0.0.1", createdAt=now, lastLogin=0, isActive=1, isLoggedIn=0)
+                for i in range(seed_users)
+            ])
+            db.commit()
+
+
+async def run_scenario(app, name: str, concurrency: int, total: int, seed_users: int) -> dict:
+    """以固定并发执行一个场景, 每个并发槽位使用独立的客户端(独立 Cookie)"""
+    from magic.utils.Argon2Password import hashPassword
+    from magic.controller import userController
+
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+    runId = int(time.time() * 1000)
+    codeSalt = hashPassword("ab12cd") if name == "register" else ""
+
+    async def slot(slotId: int):
+        nonlocal errors
+        client = app.test_client()
+        email = f"bench{slotId % seed_users}@example.com"
+        if name in ("profile", "users"):
+            await client.post("/api/v1/auth/login", json={"email": email, "password": SEED_PASSWORD})
+
+        for i in counter:
+            if name == "login":
+                call = client.post("/api/v1/auth/login", json={"email": email, "password": SEED_PASSWORD})
+            elif name == "profile":
+                call = client.get("/api/v1/auth/user/profile")
+            elif name == "users":
+                call = client.get("/api/v1/auth/users", query_string={"name": "bench1"})
+            else:
+                newEmail = f"reg{runId}-{i}@example.com"
+                userController.verification_codes[newEmail] = {"code": "ab12cd", "hash": codeSalt}
+                call = client.post("/api/v1/auth/regter", json={
+                    "email": newEmail, "username": f"r{i}", "password": SEED_PASSWORD,
+                    "code": "ab12cd", "codeSalt": codeSalt,
+                })
+            startedAt = time.perf_counter()
+            response = await call
+            body = await response.get_json()
+            latencies.append(time.perf_counter() - startedAt)
+            if response.status_code != 200 or not isinstance(body, dict) or body.get("code") != 200:
+                errors += 1
+
+    startedAt = time.perf_counter()
+    await asyncio.gather(*(slot(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - startedAt
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run(args) -> dict:
+    setup_database(args.seed_users)
+    from lmoadll_bl import app
+
+    results = {}
+    # test_app 会触发 before_serving, 即 init_app
+    async with app.test_app() as test_app:
+        for name in args.scenarios:
+            await run_scenario(test_app, name, args.concurrency, args.warmup, args.seed_users)
+            results[name] = await run_scenario(test_app, name, args.concurrency, args.requests, args.seed_users)
+            print(f"{name:<10} {results[name]['throughput_rps']:>9.1f} req/s  "
+                  f"p50 {results[name]['p50_ms']:>8.2f}ms  p95 {results[name]['p95_ms']:>8.2f}ms  "
+                  f"p99 {results[name]['p99_ms']:>8.2f}ms  errors {results[name]['errors']}")
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split("://")[0],
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lmoadll_bl 认证 API 压测")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--warmup", type=int, default=16, help="每个场景的预热请求数")
+    parser.add_argument("--seed-users", type=int, default=50)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="要对比的基线(文件路径或 benchmarks/baselines 下的名称)")
+    args = parser.parse_args()
+
+    tmpdir = None
+    if not os.getenv("DATABASE_URL"):
+        tmpdir = tempfile.TemporaryDirectory(prefix="lmoadll-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmpdir.name) / 'bench.db'}"
+
+    report = asyncio.run(run(args))
+    save_report(report, Path(args.output))
+    print(f"\n结果已写入 {args.output}")
+    if args.compare:
+        compare_reports(report, resolve_baseline(args.compare), ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"))
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#lmoadll_bl platform
+#
+#@copyright  Copyright (c) 2025 lmoadll_bl team
+#@license  GNU General Public License 3.0
+"""
+RBAC 权限检查基准: ORM 关系遍历 vs 位掩码策略
+
+在临时 SQLite 数据库中写入默认角色和权限(initDefaultRbac), 创建一个 admin 用户, 然后比较:
+    rbac.ormWalk.hasPermission       原来的 User.hasPermission 写法, 每次遍历 userRoles -> role.permissions
+    rbac.UserSnapshot.hasPermission  缓存的用户快照, 通过 POLICY 检查
+    rbac.policy.allows               CompiledPolicy 的一次按位与
+    rbac.policy.compile              从数据库重新编译整个策略
+
+用法:
+    python benchmarks/rbac_bench.py --save main
+    python benchmarks/rbac_bench.py --compare main
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from benchmarks.common import git_commit, resolve_baseline, save_report, compare_reports  # noqa: E402
+from benchmarks.utils_bench import measure  # noqa: E402
+
+PERMISSION = "system:logs"
+
+
+async def setup_database() -> int:
+    """建表、写入默认 RBAC 数据并创建一个 admin 用户, 返回其 uid"""
+    from quart import Quart
+    from magic.utils.db.connection import Base, get_engine, SessionLocal
+    from magic.models.user import User
+    from magic.models.rbac import Role, UserRole
+    from magic.service.rbac.initRBAC import initDefaultRbac
+
+    Base.metadata.create_all(bind=get_engine())
+    await initDefaultRbac(Quart(__name__))
+    with SessionLocal() as db:
+        user = User(name="rbacBench", mail="rbac@example.com", password="-", url="127.0.0.1",
+                    createdAt=int(time.time()), lastLogin=0, isActive=1, isLoggedIn=0)
+        db.add(user)
+        db.flush()
+        role = db.query(Role).filter_by(name="admin").one()
+        db.add(UserRole(userId=user.uid, roleId=role.id)) # pyright: ignore[reportArgumentType]
+        db.commit()
+        return user.uid # pyright: ignore[reportReturnType]
+
+
+def build_benchmarks(uid: int) -> dict:
+    from magic.utils.db.connection import SessionLocal
+    from magic.models.user import User, UserSnapshot
+    from magic.service.rbac.policy import POLICY
+
+    db = SessionLocal()
+    user = db.query(User).filter_by(uid=uid).one()
+    snapshot = UserSnapshot.fromUser(user)
+    policy = POLICY.current()
+
+    def ormWalk(permissionName: str) -> bool:
+        return any(
+            rolePerm.permission and rolePerm.permission.name == permissionName
+            for userRole in user.userRoles if userRole.role
+            for rolePerm in userRole.role.permissions
+        )
+
+    assert ormWalk(PERMISSION) and snapshot.hasPermission(PERMISSION)
+
+    def timed(func):
+        async def run(number: int) -> float:
+            startedAt = time.perf_counter()
+            for _ in range(number):
+                func()
+            return time.perf_counter() - startedAt
+        return run
+
+    return {
+        "rbac.ormWalk.hasPermission": timed(lambda: ormWalk(PERMISSION)),
+        "rbac.UserSnapshot.hasPermission": timed(lambda: snapshot.hasPermission(PERMISSION)),
+        "rbac.policy.allows": timed(lambda: policy.allows(snapshot.roles, PERMISSION)),
+        "rbac.policy.compile": timed(POLICY.reload),
+    }
+
+
+async def run(args) -> dict:
+    uid = await setup_database()
+    results = {}
+    for name, func in build_benchmarks(uid).items():
+        results[name] = await measure(func, args.repeat, args.min_time)
+        print(f"{name:<42} min {results[name]['min_us']:>12.3f}us  median {results[name]['median_us']:>12.3f}us")
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split("://")[0],
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lmoadll_bl RBAC 权限检查基准")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="单轮最短耗时(秒)")
+    parser.add_argument("--save", help="保存为基线(名称或 .json 路径)")
+    parser.add_argument("--compare", help="要对比的基线(名称或 .json 路径)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory(prefix="lmoadll-rbac-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmpdir.name) / 'bench.db'}"
+
+    report = asyncio.run(run(args))
+    if args.save:
+        path = resolve_baseline(args.save)
+        save_report(report, path)
+        print(f"\n基线已保存到 {path}")
+    if args.compare:
+        compare_reports(report, resolve_baseline(args.compare), ("min_us", "median_us"))
+
+
+if __name__ == "__main__":
+    main()
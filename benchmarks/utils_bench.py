@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+#lmoadll_bl platform
+#
+#@copyright  Copyright (c) 2025 lmoadll_bl team
+#@license  GNU General Public License 3.0
+"""
+每请求基础组件的微基准
+
+覆盖 jwt 签发/验证、validate 校验函数、Argon2 哈希/验证(使用当前配置参数)、
+ResponseManager._format_response(小/大负载) 与代理头中间件. 每项自动确定循环次数,
+重复多轮后记录单次调用的最小值与中位数(微秒).
+
+用法:
+    python benchmarks/utils_bench.py --save main           # 保存为 benchmarks/baselines/main.json
+    python benchmarks/utils_bench.py --compare main        # 与基线对比
+    python benchmarks/utils_bench.py --filter jwt          # 只跑名称包含 jwt 的项
+"""
+import sys
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+from pathlib import Path
+from typing import Awaitable, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from benchmarks.common import git_commit, resolve_baseline, save_report, compare_reports  # noqa: E402
+
+BENCHMARKS: dict[str, Callable[[int], Awaitable[float]]] = {}
+
+
+def bench(name: str):
+    """注册一个基准; 被注册的函数接受循环次数, 返回总耗时(秒)"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def timed_sync(func: Callable[[], object]) -> Callable[[int], Awaitable[float]]:
+    async def run(number: int) -> float:
+        startedAt = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - startedAt
+    return run
+
+
+# --- jwt ---
+@bench("jwt.generateToken")
+async def _bench_generate_token(number: int) -> float:
+    from magic.utils.jwt import generateToken, TokenManager
+    startedAt = time.perf_counter()
+    for _ in range(number):
+        await generateToken(1, "bench@example.com")
+    elapsed = time.perf_counter() - startedAt
+    TokenManager._userTokens.clear()
+    return elapsed
+
+
+@bench("jwt.verifyJwtPayload")
+async def _bench_verify_token(number: int) -> float:
+    from magic.utils.jwt import generateToken, verifyJwtPayload
+    token = await generateToken(1, "bench@example.com")
+    startedAt = time.perf_counter()
+    for _ in range(number):
+        await verifyJwtPayload(token)
+    return time.perf_counter() - startedAt
+
+
+# --- validate ---
+def _register_validators():
+    from magic.utils import validate
+    samples = {
+        "isValidEmail": "someone.long.name@example.com",
+        "isValidName": "用户_name01",
+        "isValidPassword": "abcDEF123456!",
+        "isValidURL": "https://www.example.com/path/to?x=1",
+        "isValidMailConfirmCode": "a1B2c3D",
+    }
+    for funcName, value in samples.items():
+        func = getattr(validate, funcName)
+        BENCHMARKS[f"validate.{funcName}"] = timed_sync(lambda func=func, value=value: func(value))
+
+
+# --- Argon2 ---
+@bench("Argon2Password.hashPassword")
+async def _bench_hash_password(number: int) -> float:
+    from magic.utils.Argon2Password import hashPassword
+    return await timed_sync(lambda: hashPassword("abcDEF123456"))(number)
+
+
+@bench("Argon2Password.verifyPassword")
+async def _bench_verify_password(number: int) -> float:
+    from magic.utils.Argon2Password import hashPassword, verifyPassword
+    pwHash = hashPassword("abcDEF123456") or ""
+    return await timed_sync(lambda: verifyPassword(pwHash, "abcDEF123456"))(number)
+
+
+# --- ResponseManager ---
+def _format_response_bench(rows: int):
+    async def run(number: int) -> float:
+        from quart import Quart, Response
+        from magic.middleware.response import ResponseManager
+        app = Quart(__name__)
+        manager = ResponseManager(app)
+        payload = [{"uid": i, "name": f"user{i}", "email": f"user{i}@example.com", "createdAt": 1700000000} for i in range(rows)]
+        body = app.json.dumps(payload)
+        elapsed = 0.0
+        async with app.test_request_context("/bench"):
+            for _ in range(number):
+                response = Response(body, content_type="application/json")
+                startedAt = time.perf_counter()
+                await manager._format_response(response)
+                elapsed += time.perf_counter() - startedAt
+        return elapsed
+    return run
+
+
+BENCHMARKS["ResponseManager._format_response[small]"] = _format_response_bench(1)
+BENCHMARKS["ResponseManager._format_response[large]"] = _format_response_bench(1000)
+
+
+# --- 代理中间件 ---
+def _proxy_middleware_bench(client: str, forwarded_headers: list[tuple[bytes, bytes]]):
+    async def run(number: int) -> float:
+        from magic.middleware.proxy import setup_proxy_fix_middleware
+
+        class _App:
+            async def asgi_app(self, scope, receive, send):
+                return None
+
+        app = _App()
+        setup_proxy_fix_middleware(app, ["127.0.0.0/8", "::1/128", "10.0.0.0/8"])
+        headers = [
+            (b"host", b"example.com"), (b"user-agent", b"bench"), (b"accept", b"*/*"),
+            (b"cookie", b"forestwhisper=x"), *forwarded_headers,
+        ]
+        startedAt = time.perf_counter()
+        for _ in range(number):
+            scope = {"type": "http", "client": (client, 50000), "scheme": "http", "headers": headers}
+            await app.asgi_app(scope, None, None)
+        return time.perf_counter() - startedAt
+    return run
+
+
+BENCHMARKS["proxy_fix_middleware[x-forwarded-for]"] = _proxy_middleware_bench(
+    "10.0.0.2", [(b"x-forwarded-proto", b"https"), (b"x-forwarded-for", b"203.0.113.7, 10.0.0.3, 127.0.0.1")]
+)
+BENCHMARKS["proxy_fix_middleware[forwarded]"] = _proxy_middleware_bench(
+    "10.0.0.2", [(b"forwarded", b'for=203.0.113.7;proto=https, for="[2001:db8::1]:4711", for=10.0.0.3')]
+)
+BENCHMARKS["proxy_fix_middleware[untrusted]"] = _proxy_middleware_bench(
+    "198.51.100.9", [(b"x-forwarded-for", b"203.0.113.7")]
+)
+
+
+async def measure(func: Callable[[int], Awaitable[float]], repeat: int, min_time: float) -> dict:
+    """类似 timeit.autorange: 先找到单轮不少于 min_time 的循环次数, 再重复 repeat 轮"""
+    number = 1
+    while True:
+        elapsed = await func(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    samples = [await func(number) / number for _ in range(repeat)]
+    return {
+        "loops": number,
+        "repeat": repeat,
+        "min_us": round(min(samples) * 1e6, 3),
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+    }
+
+
+async def run(args) -> dict:
+    _register_validators()
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = await measure(func, args.repeat, args.min_time)
+        print(f"{name:<42} min {results[name]['min_us']:>12.3f}us  median {results[name]['median_us']:>12.3f}us")
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lmoadll_bl 工具函数微基准")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="单轮最短耗时(秒)")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的基准")
+    parser.add_argument("--save", help="保存为基线(名称或 .json 路径)")
+    parser.add_argument("--compare", help="要对比的基线(名称或 .json 路径)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.save:
+        path = resolve_baseline(args.save)
+        save_report(report, path)
+        print(f"\n基线已保存到 {path}")
+    if args.compare:
+        compare_reports(report, resolve_baseline(args.compare), ("min_us", "median_us"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 """Gunicorn配置文件"""
+import os
 import multiprocessing
+import importlib.util
 
+if importlib.util.find_spec("uvicorn") is None:
+    raise SystemExit("gunicorn 部署需要安装 uvicorn(pip install uvicorn), 或者改用 python start.py(hypercorn)")
 
 
 bind = "0.0.0.0:2324"
 """绑定地址和端口"""
 
-worker_class = "gthread"
-"""工作进程类型, 可以是sync, gevent, gthread, eventlet等"""
+worker_class = "uvicorn.workers.UvicornWorker"
+"""
+工作进程类型; lmoadll_bl 是 ASGI 应用, 必须使用 ASGI worker.
+推荐的部署方式是 start.py(hypercorn, 项目本身的依赖); hypercorn 没有提供 gunicorn worker,
+所以只有用 gunicorn 部署时才需要额外安装 uvicorn(pip install uvicorn), 它是这种部署方式的可选依赖.
+"""
 
 pidfile = "gunicorn.pid"
 """进程ID文件"""
@@ -16,12 +24,6 @@ pidfile = "gunicorn.pid"
 proc_name = "lmoadll_bl"
 """进程名称"""
 
-threads = 2
-"""每个工作进程的线程数"""
-
-worker_connections = 512
-"""最大并发数"""
-
 timeout = 30
 """请求超时时间(秒)"""
 
@@ -41,10 +43,11 @@ syslog = False
 """服务器标识"""
 
 preload_app = True
-"""预加载应用, 减少内存使用和启动时间"""
+"""预加载应用, 减少内存使用和启动时间; fork 后由 post_fork 重建连接池、日志句柄等进程状态"""
 
-workers = multiprocessing.cpu_count() * 2 + 1
-"""工作进程数量, 通常设置为CPU核心数的2倍加1"""
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+"""工作进程数量, 通常设置为CPU核心数的2倍加1; 数据库连接池按 [db] MAX_CONNECTIONS / workers 分配"""
+os.environ["WEB_CONCURRENCY"] = str(workers)  # worker 继承, 连接池预算按实际 worker 数计算
 
 # 访问日志格式
 accesslog = "-"  # 输出到标准输出
@@ -62,3 +65,23 @@ forwarded_allow_ips = "*"  # *或者指定具体的代理IP，如 '127.0.0.1,10.
 
 secure_scheme_headers = {"X-FORWARDED-PROTO": "https"}
 """安全头部配置"""
+
+
+def on_starting(server):
+    """主进程启动时创建日志文件(导入 magic 本身不再初始化日志), 清理上次运行留下的指标快照"""
+    from magic.utils.log3 import init_logger
+    from magic.utils.metrics import clearSnapshots
+    init_logger()
+    clearSnapshots()
+
+
+def child_exit(server, worker):
+    """worker 退出后把它的计数累加进已退出进程的合计, 不在可复用的 pid 下留下快照"""
+    from magic.utils.metrics import markProcessDead
+    markProcessDead(worker.pid)
+
+
+def post_fork(server, worker):
+    """worker fork 之后重建继承自主进程的状态(连接池、日志文件句柄、进程内缓存)"""
+    from magic.utils.forkSafety import reinitializeAfterFork
+    reinitializeAfterFork()
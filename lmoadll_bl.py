@@ -16,7 +16,9 @@ app.config["DEBUG"] = os.getenv("debug", "False").lower() in ("true", "1", "t")
 app.json.sort_keys = False # pyright: ignore[reportAttributeAccessIssue]
 ResponseManager(app)
 
+@app.before_serving
 async def init_app():
+    """在实际处理请求的事件循环上初始化, 避免初始化时创建的对象绑定到其它循环"""
     await Init_module(app)
 
 @app.get("/")
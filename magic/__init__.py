@@ -7,44 +7,75 @@
 主要的lmoadll的组件, 这是魔法()
 """
 
-from quart import Quart
-from quart_cors import cors
-from magic.utils.TomlConfig import check_config_file
-from magic.utils.log3 import logger  # noqa: F401
-from magic.PluginSystem import init_plugin_system
-from magic.routes.routes import combineRoutes
-from magic.PluginSystem import get_plugin_manager
-from magic.utils import jwt
-from magic.utils.db.connection import init_db
-from magic.service.rbac.initRBAC import initDefaultRbac
-from magic.middleware.proxy import setup_proxy_fix_middleware
-import logging
 import os
+import logging
+from typing import TYPE_CHECKING
+from magic.utils.startupProfile import phase
+
+if TYPE_CHECKING:
+    from quart import Quart
 
+# 导入 magic 不应产生副作用: 数据库引擎、日志文件、路由和插件都在 Init_module 中按需创建
 
-async def Init_module(app: Quart) -> None:
+
+async def Init_module(app: "Quart") -> None:
     """初始化模块"""
-    
-    plugin_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'contents', 'plugin')
-    plugin_manager = init_plugin_system(plugin_dir)
-    plugin_manager.load_plugins()
-    logging.info("插件系统初始化完成")
-
-    setup_proxy_fix_middleware(app)
-    
-    cors(app, allow_origin={r"/api/*": {
-            "origins": "*",
-            "methods": ["GET", "POST"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "expose_headers": [],
-            "max_age": 600
-        }},
-        allow_headers=["Content-Type","Authorization","X-Requested-With"],
-        expose_headers=["X-RateLimit-Limit","X-RateLimit-Remaining","X-RateLimit-Reset"],
-        max_age=600)
-
-    plugin_manager = get_plugin_manager()
-    plugin_manager.register_all_api_routes(app)
-    await combineRoutes(app)
-    init_db()
-    await initDefaultRbac(app)
+    with phase("日志"):
+        from magic.utils.log3 import init_logger
+        init_logger()
+
+    with phase("插件系统"):
+        from magic.PluginSystem import init_plugin_system
+        plugin_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'contents', 'plugin')
+        plugin_manager = init_plugin_system(plugin_dir)
+        plugin_manager.load_plugins()
+        logging.info("插件系统初始化完成")
+
+    with phase("中间件"):
+        from quart_cors import cors
+        from magic.middleware.proxy import setup_proxy_fix_middleware
+        from magic.middleware.compress import setup_compression_middleware
+        setup_proxy_fix_middleware(app)
+        setup_compression_middleware(app, routes={"/metrics": {"min_size": 4096}})
+
+    with phase("指标"):
+        from magic.utils.metrics import setupMetricsSnapshots
+        setupMetricsSnapshots(app)
+        
+        cors(app, allow_origin={r"/api/*": {
+                "origins": "*",
+                "methods": ["GET", "POST"],
+                "allow_headers": ["Content-Type", "Authorization"],
+                "expose_headers": [],
+                "max_age": 600
+            }},
+            allow_headers=["Content-Type","Authorization","X-Requested-With"],
+            expose_headers=["X-RateLimit-Limit","X-RateLimit-Remaining","X-RateLimit-Reset"],
+            max_age=600)
+
+    with phase("路由"):
+        from magic.routes.routes import combineRoutes
+        plugin_manager.register_all_api_routes(app)
+        await combineRoutes(app)
+
+    with phase("静态资源"):
+        from magic.asses import AssetStore, asset_url
+        AssetStore.load()
+        app.jinja_env.globals["asset_url"] = asset_url
+
+    with phase("数据库"):
+        from magic.utils.db.connection import init_db, setup_db_lifecycle
+        from magic.utils.db.instrument import setupQueryInstrumentation
+        from magic.service.loginActivity import setupLoginActivity
+        from magic.service.audit import setupAuditLog
+        from magic.service.dashboardStats import setupDashboardStats
+        init_db()
+        setup_db_lifecycle(app)
+        setupQueryInstrumentation(app)
+        setupLoginActivity(app)
+        setupAuditLog(app)
+        setupDashboardStats(app)
+
+    with phase("RBAC"):
+        from magic.service.rbac.initRBAC import initDefaultRbac
+        await initDefaultRbac(app)
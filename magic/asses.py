@@ -1,10 +1,121 @@
-from quart import send_from_directory
+# -*- coding: utf-8 -*-
+"""
+后台静态资源
+
+启动时把 admin/asses 下的 css/js 读入内存, 计算内容哈希并预先生成
+gzip / brotli(安装了 brotli 时) 压缩版本. 请求时按 Accept-Encoding
+直接从内存返回, 带强 ETag:
+
+    /asses/admin/admin.css            -> Cache-Control: no-cache, 通过 ETag 协商 304
+    /asses/admin/admin.3f2a1b9c.css   -> Cache-Control: immutable, 缓存一年
+
+模板中可以用 asset_url("admin.css") 得到带指纹的地址.
+"""
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass, field
+from pathlib import Path
+from quart import request, Response, abort
+from magic.utils.log3 import logger
+from magic.middleware.compress import negotiate_encoding
+from magic.middleware.etag import etagMatches
+
+try:
+    import brotli  # pyright: ignore[reportMissingImports]
+except ImportError:  # brotli 是可选依赖
+    brotli = None
+
+
+ASSET_DIR = Path(__file__).parents[1] / "admin" / "asses"
+ASSET_SUFFIXES = {".css", ".js"}
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+@dataclass
+class Asset:
+    name: str
+    digest: str
+    content_type: str
+    variants: dict[str, bytes] = field(default_factory=dict)  # 编码 -> 内容, "identity" 为原文
+
+    @property
+    def fingerprinted_name(self) -> str:
+        stem, _, suffix = self.name.rpartition(".")
+        return f"{stem}.{self.digest}.{suffix}"
+
+
+class AssetStore:
+    """内存中的静态资源表"""
+    _assets: dict[str, Asset] = {}
+    _by_fingerprint: dict[str, Asset] = {}
+
+    @classmethod
+    def load(cls, directory: Path = ASSET_DIR) -> None:
+        """读取目录下的资源并生成压缩版本"""
+        assets, by_fingerprint = {}, {}
+        for path in sorted(directory.glob("*")):
+            if path.suffix not in ASSET_SUFFIXES or not path.is_file():
+                continue
+            raw = path.read_bytes()
+            content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            asset = Asset(path.name, hashlib.sha256(raw).hexdigest()[:8], f"{content_type}; charset=utf-8")
+            asset.variants["identity"] = raw
+            asset.variants["gzip"] = gzip.compress(raw, compresslevel=9, mtime=0)
+            if brotli is not None:
+                asset.variants["br"] = brotli.compress(raw, quality=11)
+            assets[asset.name] = asset
+            by_fingerprint[asset.fingerprinted_name] = asset
+        cls._assets, cls._by_fingerprint = assets, by_fingerprint
+        logger.info(f"静态资源已加载: {len(assets)} 个文件")
+
+    @classmethod
+    def lookup(cls, filename: str) -> tuple[Asset | None, bool]:
+        """按文件名查找资源, 返回 (资源, 是否为带指纹的地址)"""
+        if not cls._assets:
+            cls.load()
+        asset = cls._by_fingerprint.get(filename)
+        if asset is not None:
+            return asset, True
+        return cls._assets.get(filename), False
+
+
+def asset_url(name: str, prefix: str = "admin") -> str:
+    """返回带指纹的资源地址, 找不到时退回原地址"""
+    asset, _ = AssetStore.lookup(name)
+    if asset is None:
+        return f"/asses/{prefix}/{name}"
+    return f"/asses/{prefix}/{asset.fingerprinted_name}"
+
+
+def serve_asset(filename: str) -> Response:
+    asset, fingerprinted = AssetStore.lookup(filename)
+    if asset is None:
+        abort(404)
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""), asset.variants, ("br", "gzip"))
+    etag = f'"{asset.digest}-{encoding}"'
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": IMMUTABLE_CACHE if fingerprinted else REVALIDATE_CACHE,
+    }
+
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match and etagMatches(if_none_match, etag):
+        return Response(b"", status=304, headers=headers)
+
+    body = asset.variants[encoding]
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, content_type=asset.content_type, headers=headers)
+
 
 class asses:
     @staticmethod
-    def admin_assess_css(filename):
-        return send_from_directory('admin/asses/', filename)
+    async def admin_assess_css(filename):
+        return serve_asset(filename)
 
     @staticmethod
-    def install_assess(filename):
-        return send_from_directory('admin/asses/', filename)
+    async def install_assess(filename):
+        return serve_asset(filename)
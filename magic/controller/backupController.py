@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+from contextlib import closing
+from quart import request, Response
+from magic.service.backup import FORMATS, backupFilename, exportBackup
+from magic.service.audit import audit
+from magic.utils.db.connection import get_engine
+from magic.middleware.response import APIException
+from magic.middleware.auth import AuthMiddleware
+
+
+class BackupController:
+    @staticmethod
+    @AuthMiddleware("system:backup")
+    async def export():
+        """
+        下载数据库备份, 边导出边输出
+
+        查询参数 format:
+            ndjson(默认): 用户与 RBAC 五张表的一致快照, gzip 压缩的 NDJSON
+            sqlite: SQLite 数据库的完整副本, 仅 SQLite 部署可用
+        """
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in FORMATS:
+            raise APIException("不支持的备份格式喵", code=233)
+        if fmt == "sqlite" and get_engine().dialect.name != "sqlite":
+            raise APIException("当前数据库不是 SQLite, 请使用 ndjson 格式喵", code=233)
+        audit("system.backup", "database", format=fmt)
+
+        async def generate():
+            # 整个导出在同一个线程里完成(游标和事务不跨线程), 通过有界队列交给事件循环;
+            # 客户端断开时通知导出线程停止, 由它自己关闭生成器, 结束只读事务
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+            stop = threading.Event()
+
+            def produce() -> None:
+                def put(item) -> None:
+                    asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+                try:
+                    with closing(exportBackup(fmt)) as blocks:
+                        for block in blocks:
+                            put(block)
+                            if stop.is_set():
+                                return
+                    put(None)
+                except Exception as e:
+                    if not stop.is_set():
+                        put(e)
+
+            producer = loop.run_in_executor(None, produce)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                stop.set()
+                while not queue.empty():  # 腾出空位, 让阻塞在 put 上的导出线程看到 stop
+                    queue.get_nowait()
+                await producer
+
+        filename = backupFilename(fmt)
+        response = Response(generate(), content_type="application/gzip" if fmt == "ndjson" else "application/vnd.sqlite3")
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response.timeout = None # pyright: ignore[reportAttributeAccessIssue]
+        return response
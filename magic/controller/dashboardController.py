@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from quart import jsonify
+from magic.service.dashboardStats import STATS
+from magic.middleware.auth import AuthMiddleware
+
+
+class DashboardController:
+    @staticmethod
+    @AuthMiddleware("user:read")
+    async def stats():
+        """仪表盘统计, 直接读取内存中的计数, 启动后尚未对账时先对账一次"""
+        if not STATS.reconciledAt:
+            await asyncio.to_thread(STATS.reconcile)
+        return jsonify(STATS.snapshot())
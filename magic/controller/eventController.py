@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from quart import request, Response
+from magic.utils.TomlConfig import GetConfigToml
+from magic.utils.eventHub import EVENT_HUB
+from magic.middleware.auth import AuthMiddleware
+
+
+class EventController:
+    @staticmethod
+    @AuthMiddleware("user:read")
+    async def stream():
+        """
+        管理后台事件流(Server-Sent Events)
+
+        查询参数 topics 为逗号分隔的主题前缀(user, role, permission, 即 audit() 记录的事件), 省略则订阅全部.
+        浏览器 EventSource 断线重连时会带上 Last-Event-ID, 服务端补发期间错过的事件;
+        无法补发时(服务重启过、重连到了另一个 worker、错过的事件太多)先发送 resync 事件, 客户端应重新拉取数据.
+        客户端读取过慢被踢出时会收到 evicted 事件, 重连即可.
+
+        配置项([events] 段): MAX_BUFFER 每个连接的缓冲事件数(默认 100), HEARTBEAT 心跳间隔秒数(默认 15)
+        """
+        topics = frozenset(t.strip() for t in request.args.get("topics", "").split(",") if t.strip()) or None
+        lastEventId = request.headers.get("Last-Event-ID", "")
+        heartbeat = GetConfigToml("events", "HEARTBEAT", 15.0)
+        subscriber = EVENT_HUB.subscribe(
+            topics,
+            maxBuffer=GetConfigToml("events", "MAX_BUFFER", 100),
+            lastEventId=lastEventId or None
+        )
+        resyncId = EVENT_HUB.lastEventId()  # 订阅之后发布的事件都会进入队列
+
+        async def generate():
+            try:
+                yield b"retry: 3000\n: connected\n\n"
+                if subscriber.resync:
+                    yield f"id: {resyncId}\nevent: resync\ndata: {{}}\n\n".encode("utf-8")
+                while True:
+                    if subscriber.evicted and subscriber.queue.empty():
+                        yield b"event: evicted\ndata: {}\n\n"
+                        return
+                    try:
+                        event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                    except asyncio.TimeoutError:
+                        yield b": ping\n\n"
+                        continue
+                    yield event.toSse()
+            finally:
+                EVENT_HUB.unsubscribe(subscriber)
+
+        response = Response(generate(), content_type="text/event-stream; charset=utf-8", headers={
+            "Cache-Control": "no-cache, no-transform",  # no-transform: 压缩中间件不处理
+            "X-Accel-Buffering": "no",                  # 关闭 nginx 缓冲
+        })
+        response.timeout = None # pyright: ignore[reportAttributeAccessIssue]
+        return response
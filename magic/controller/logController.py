@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import json
+import asyncio
+from itertools import islice
+from quart import request, Response
+from magic.utils.logSearch import LogQuery, searchLogs, parseTime, normalizeLevel
+from magic.middleware.response import APIException
+from magic.middleware.auth import AuthMiddleware
+
+MAX_LIMIT = 10000
+BATCH_SIZE = 200
+
+
+class LogController:
+    @staticmethod
+    @AuthMiddleware("system:logs")
+    async def search():
+        """
+        日志检索, 以 NDJSON 流式返回匹配的记录(按时间顺序)
+
+        查询参数:
+            start / end: 时间范围, epoch 秒或 ISO 时间(本地时间)
+            level: 逗号分隔的级别, 如 ERROR,WARNING 或 ERR,WRN
+            q: 子串; ignoreCase=1 时不区分大小写
+            limit: 最多返回条数, 默认 1000, 上限 10000
+        """
+        args = request.args
+        try:
+            levels = {normalizeLevel(level) for level in args.get("level", "").split(",") if level.strip()}
+            if None in levels:
+                raise ValueError(args.get("level"))
+            query = LogQuery(
+                start=parseTime(args.get("start")),
+                end=parseTime(args.get("end")),
+                levels=levels or None, # pyright: ignore[reportArgumentType]
+                contains=args.get("q", "").encode("utf-8") or None,
+                ignoreCase=args.get("ignoreCase") == "1",
+            )
+            limit = min(int(args.get("limit", 1000)), MAX_LIMIT)
+        except ValueError:
+            raise APIException("查询参数格式不正确喵", code=233)
+
+        async def generate():
+            # 文件读取在线程中分批进行, 不阻塞事件循环
+            records = searchLogs(query, limit)
+            while True:
+                batch = await asyncio.to_thread(lambda: list(islice(records, BATCH_SIZE)))
+                if not batch:
+                    return
+                yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch).encode("utf-8")
+
+        response = Response(generate(), content_type="application/x-ndjson; charset=utf-8")
+        response.timeout = None # pyright: ignore[reportAttributeAccessIssue]
+        return response
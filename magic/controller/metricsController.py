@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import hmac
+import ipaddress
+from quart import request, Response
+from magic.utils.TomlConfig import DoesitexistConfigToml
+from magic.utils.metrics import renderMetrics, CONTENT_TYPE_LATEST
+from magic.middleware.response import APIException
+
+
+def _isLoopback(address: str | None) -> bool:
+    try:
+        return ipaddress.ip_address(address or "").is_loopback
+    except ValueError:
+        return False
+
+
+class MetricsController:
+    @staticmethod
+    async def metrics():
+        """Prometheus 指标导出
+
+        配置了 [metrics] TOKEN 时要求请求头 Authorization: Bearer <TOKEN>;
+        未配置时只允许本机(loopback)访问, 避免路由、耗时和数据库统计默认对外公开
+        """
+        token = DoesitexistConfigToml("metrics", "TOKEN")
+        if token:
+            auth = request.headers.get("Authorization", "")
+            if not hmac.compare_digest(auth, f"Bearer {token}"):
+                raise APIException("没有访问指标的权限喵", code=403)
+        elif not _isLoopback(request.remote_addr):
+            raise APIException("未配置 [metrics] TOKEN 时只允许本机访问指标喵", code=403)
+        return Response(renderMetrics(), content_type=CONTENT_TYPE_LATEST)
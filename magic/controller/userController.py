@@ -1,21 +1,55 @@
 # -*- coding: utf-8 -*-
+import re
 import time
 import logging
-import random
+import secrets
 import string
+from typing import cast
 from magic.models.user import User
-from quart import request, jsonify
+from quart import request, jsonify, g
 from cachetools import TTLCache
-from magic.utils.validate import isValidName, isValidPassword, isValidEmail
-from magic.utils.cookies import setCookieToken
+from magic.utils.validate import EMAIL_PATTERN, NAME_PATTERN, PASSWORD_PATTERN
+from magic.utils.schema import Schema, Field
+from magic.utils.cookies import setCookieToken, setRefreshCookie, REFRESH_COOKIE
+from magic.utils.jwt import refreshLoginTokens, issueLoginTokens
 from magic.utils.Argon2Password import hashPassword
-from magic.utils.Mail import sendMailAsync
 from magic.service.userService import UserService
 from magic.middleware.response import APIException
 from magic.middleware.auth import AuthMiddleware, getCurrentUser
+from magic.middleware.etag import ConditionalGet
 
 
 CODEEXPIRATIONTIME = 300
+REGISTER_CODE_PATTERN = re.compile(r"^[a-zA-Z0-9]{6}$")
+
+LOGIN_SCHEMA = Schema(
+    email=Field(pattern=EMAIL_PATTERN, message="邮箱或密码格式不正确喵"),
+    password=Field(pattern=PASSWORD_PATTERN, message="邮箱或密码格式不正确喵"),
+)
+REGISTER_SCHEMA = Schema(
+    email=Field(pattern=EMAIL_PATTERN, message="邮箱格式不正确喵"),
+    username=Field(pattern=NAME_PATTERN, minLen=2, maxLen=50, message="用户名应为2-17位中文、字母、数字或下划线喵喵"),
+    password=Field(pattern=PASSWORD_PATTERN, minLen=8, message="密码应不少于8个字符且同时包含字母和数字喵喵"),
+    code=Field(pattern=REGISTER_CODE_PATTERN, message="验证码应为6位字母+数字喵喵"),
+    codeSalt=Field(minLen=1, message="验证码哈希不能为空喵喵"),
+)
+EMAIL_CODE_SCHEMA = Schema(
+    email=Field(pattern=EMAIL_PATTERN, message="邮箱格式错误喵"),
+)
+CREATE_USER_SCHEMA = Schema(
+    email=Field(pattern=EMAIL_PATTERN, message="参数格式不正确喵"),
+    username=Field(pattern=NAME_PATTERN, message="参数格式不正确喵"),
+    password=Field(pattern=PASSWORD_PATTERN, message="参数格式不正确喵"),
+)
+UPDATE_USER_SCHEMA = Schema(
+    uid=Field(kind=int, message="用户ID不能为空喵"),
+    username=Field(pattern=NAME_PATTERN, required=False, message="用户名格式不正确喵"),
+    email=Field(pattern=EMAIL_PATTERN, required=False, message="邮箱格式不正确喵"),
+    password=Field(pattern=PASSWORD_PATTERN, required=False, message="密码格式不正确喵"),
+)
+UID_SCHEMA = Schema(
+    uid=Field(kind=int, message="用户ID不能为空喵"),
+)
 verification_codes = TTLCache(maxsize=1000000, ttl=CODEEXPIRATIONTIME) # {email: {"code": 验证码, "hash": 验证码哈希, "expiresAt": 过期时间戳}}
 
 def verifyCode(email: str, code: str, codeSalt: str) -> tuple[bool, str | None]:
@@ -35,13 +69,10 @@ def verifyCode(email: str, code: str, codeSalt: str) -> tuple[bool, str | None]:
 class UserController:
     @staticmethod
     async def login():
-        data = await request.get_json()
+        data = LOGIN_SCHEMA.validate(await request.get_json())
         email, password = (data["email"], data["password"])
 
-        if not isValidEmail(email) or not isValidPassword(password):
-            raise APIException("邮箱或密码格式不正确喵", code=233)
-
-        result = await UserService.loginUser(email, password)
+        result = await UserService.loginUser(email, password, request.remote_addr or "")
         if isinstance(result, int):
             raise APIException(f"{result}", code=500)
         payload = {
@@ -49,21 +80,25 @@ class UserController:
         }
         response = jsonify(payload) 
         setCookieToken(response, result["token"])
-        print(result)
+        setRefreshCookie(response, result["refreshToken"])
+        return response
+
+    @staticmethod
+    async def refresh():
+        """用刷新令牌换取新的访问令牌, 不需要重新输入密码"""
+        tokens = await refreshLoginTokens(request.cookies.get(REFRESH_COOKIE))
+        if tokens is None:
+            raise APIException("登录已过期, 请重新登录喵喵", code=401)
+        accessToken, refreshToken = tokens
+        response = jsonify({"message": "刷新成功喵"})
+        setCookieToken(response, accessToken)
+        setRefreshCookie(response, refreshToken)
         return response
     
     @staticmethod
     async def register():
-        data = await request.get_json()
-        if not isValidEmail(data["email"]) or not isValidName(data["username"]) or not isValidPassword(data["password"]):
-            raise APIException("用户名或密码格式不正确喵", code=233)
-        if len(data["username"]) < 2 or len(data["username"]) > 50:
-            raise APIException("用户名长度应在2-50个字符之间喵喵", code=233)
-        if len(data["password"]) < 8:
-            raise APIException("密码长度应不少于8个字符喵喵", code=233)
-        if len(data["code"]) != 6:
-            raise APIException("验证码应为6位字母+数字喵喵", code=233)
-        if await UserService.getUserByEmail(data["email"]):
+        data = REGISTER_SCHEMA.validate(await request.get_json())
+        if await UserService.emailExists(data["email"]):
             raise APIException("该邮箱已被注册喵喵", code=233)
         is_valid, error_message = verifyCode(data["email"], data["code"], data["codeSalt"])
         if not is_valid:
@@ -74,32 +109,27 @@ class UserController:
             raise APIException("密码哈希处理失败喵喵", code=500)
         clientIp = request.remote_addr or ""
         
-        await UserService.createUser(
+        user = await UserService.createUser(
             name=data["username"],
             email=data["email"],
             password=passwordHash,
             ip=clientIp
         )
 
-        result = await UserService.loginUser(data["email"], data["password"])
-        if isinstance(result, int):
-            raise APIException(f"{result}", code=500)
-        tokenResult = result["token"]
-        payload = {}
-        response = jsonify(payload)
-        setCookieToken(response, tokenResult)
-        return {"message": "注册成功喵"}
+        # 密码刚刚哈希过, 直接用新建的用户签发令牌, 不再走 loginUser 重新查询和验证
+        token, refreshToken = await issueLoginTokens(cast(int, user.uid), cast(str, user.mail))
+        response = jsonify({"message": "注册成功喵"})
+        setCookieToken(response, token)
+        setRefreshCookie(response, refreshToken)
+        return response
 
     @staticmethod    
     async def sendEmailCodeRegister():
-        data = await request.get_json()
-
-        if not isValidEmail(data["email"]):
-            raise APIException("邮箱格式错误喵", code=233)
-        if await UserService.getUserByEmail(data["email"]):
+        data = EMAIL_CODE_SCHEMA.validate(await request.get_json())
+        if await UserService.emailExists(data["email"]):
             raise APIException("您的邮箱已经被使用了喵, 请换一个试试喵", code=233)
 
-        code = ''.join(random.choices(string.ascii_letters + string.digits, k=6))
+        code = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(6))
         codeSalt = hashPassword(code)
         if not codeSalt:
             logging.error("验证码哈希失败")
@@ -115,6 +145,7 @@ class UserController:
         </div>
         """
 
+        from magic.utils.Mail import sendMailAsync  # smtplib/email 只在发信时导入
         mailSent = await sendMailAsync("注册验证码", [data["email"]], htmlContent)
         if not mailSent:
             raise APIException("邮件服务连接超时, 请稍后再试喵喵", code=500)
@@ -131,6 +162,7 @@ class UserController:
     
     @staticmethod
     @AuthMiddleware()
+    @ConditionalGet("users", lambda: str(g.currentUser.uid))
     async def getUserProfile():
         """获取用户信息"""
         user = await getCurrentUser()
@@ -139,6 +171,7 @@ class UserController:
     
     @staticmethod
     @AuthMiddleware()
+    @ConditionalGet(("users", "logins"), lambda: f"{request.args.get('name', '')}\0{request.args.get('exactly', '')}")
     async def getUserByUsername():
         """查询用户列表"""
         name = request.args.get("name", "")
@@ -163,9 +196,7 @@ class UserController:
     @AuthMiddleware()
     async def createUser():
         """创建用户"""
-        data = await request.get_json()
-        if not isValidEmail(data.get("email")) or not isValidName(data.get("username")) or not isValidPassword(data.get("password")):
-            raise APIException("参数格式不正确喵", code=233)
+        data = CREATE_USER_SCHEMA.validate(await request.get_json())
         
         passwordHash = hashPassword(data["password"])
         if not passwordHash:
@@ -183,10 +214,12 @@ class UserController:
     @AuthMiddleware()
     async def updateUser():
         """修改用户信息"""
-        data = await request.get_json()
-        if not data.get("uid"):
-            raise APIException("用户ID不能为空喵", code=233)
-        
+        data = UPDATE_USER_SCHEMA.validate(await request.get_json())
+        if data.get("password"):
+            passwordHash = hashPassword(data["password"])
+            if not passwordHash:
+                raise APIException("密码哈希处理失败喵喵", code=500)
+            data["password"] = passwordHash
         result = await UserService.updateUser(data["uid"], data)
         if not result:
             raise APIException("用户不存在或修改失败喵喵", code=500)
@@ -196,10 +229,7 @@ class UserController:
     @AuthMiddleware()
     async def deleteUser():
         """删除用户"""
-        data = await request.get_json()
-        if not data.get("uid"):
-            raise APIException("用户ID不能为空喵", code=233)
-        
+        data = UID_SCHEMA.validate(await request.get_json())
         result = await UserService.deleteUser(data["uid"])
         if not result:
             raise APIException("用户不存在或删除失败喵喵", code=500)
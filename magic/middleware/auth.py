@@ -1,9 +1,8 @@
 # -*- coding: utf-8 -*-
-from quart import request
+from quart import request, g
 from functools import wraps
 from magic.utils.jwt import verifyJwtPayload
-from magic.utils.db.connection import get_db
-from magic.models.user import User
+from magic.service.userService import UserService
 from magic.middleware.response import APIException
 
 
@@ -11,11 +10,13 @@ async def getCurrentUser():
     """
     获取当前用户信息
 
-    从 Token 中获取用户UID, 然后从数据库中加载完整的用户对象, 包括角色和权限
+    从 Token 中获取用户UID, 然后加载用户快照, 包括角色和权限(经过 USER_CACHE 缓存)
 
     return:
-        User: 如果用户已登录, 返回用户对象; 否则返回 None
+        UserSnapshot: 如果用户已登录, 返回用户快照; 否则返回 None
     """
+    if "currentUser" in g:
+        return g.currentUser
     token = request.cookies.get('forestwhisper')
     if not token:
         return None
@@ -23,8 +24,8 @@ async def getCurrentUser():
     if not payload:
         return None
     
-    db = get_db()
-    user = db.query(User).filter(User.uid == payload.uid).first()
+    user = await UserService.getUserById(payload.uid)
+    g.currentUser = user
     return user
 
 def AuthMiddleware(requiredPermission: str | None = None):
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+响应压缩中间件
+
+按 Accept-Encoding 协商 zstd / br / gzip, 只压缩超过阈值且类型可压缩的响应,
+已经带 Content-Encoding 的响应(例如预压缩的静态资源)原样透传.
+分块响应边收边压, 每块 flush 一次, 不会把整个响应缓存在内存里.
+正文先缓存到 MIN_SIZE 字节(或响应结束)再决定是否压缩; 压缩后的响应把强 ETag 改为弱 ETag.
+
+配置项([compression] 段):
+    MIN_SIZE: 最小压缩字节数, 默认 1024
+    LEVEL: 压缩等级(gzip 1-9), 默认 6
+按路由调整可以给 setup_compression_middleware 传入 routes, 以路径前缀匹配:
+    setup_compression_middleware(app, routes={"/api/v1/auth/users": {"min_size": 256}, "/metrics": {"enabled": False}})
+"""
+import zlib
+from typing import Callable, Protocol
+from magic.utils.TomlConfig import GetConfigToml
+
+try:
+    import brotli  # pyright: ignore[reportMissingImports]
+except ImportError:  # brotli 是可选依赖
+    brotli = None
+
+try:
+    import zstandard  # pyright: ignore[reportMissingImports]
+except ImportError:  # zstandard 是可选依赖
+    zstandard = None
+
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "application/xml",
+    "application/x-ndjson", "image/svg+xml", "text/html", "text/css",
+    "text/plain", "text/javascript", "text/xml",
+)
+
+
+def available_encodings() -> tuple[str, ...]:
+    """当前环境可用的编码, 按优先级排序"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def negotiate_encoding(accept_encoding: str, available, preference=("zstd", "br", "gzip")) -> str:
+    """按 Accept-Encoding 选择编码, q 值相同时按 preference 顺序"""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = "identity", 0.0
+    for encoding in preference:
+        q = accepted.get(encoding, wildcard)
+        if encoding in available and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor(Protocol):
+    """流式压缩接口, final=True 时结束压缩流"""
+
+    def compress(self, data: bytes, final: bool) -> bytes: ...
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliCompressor:
+    def __init__(self, level: int):
+        assert brotli is not None
+        self._obj = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._obj.process(data) + (self._obj.finish() if final else self._obj.flush())
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int):
+        assert zstandard is not None
+        self._obj = zstandard.ZstdCompressor(level=min(level, 19)).compressobj()
+        self._flushBlock = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._flushFinish = zstandard.COMPRESSOBJ_FLUSH_FINISH
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(self._flushFinish if final else self._flushBlock)
+
+
+COMPRESSORS: dict[str, Callable[[int], _Compressor]] = {
+    "gzip": _GzipCompressor,
+    "br": _BrotliCompressor,
+    "zstd": _ZstdCompressor,
+}
+
+
+def _weaken_etag(headers: list) -> list:
+    """压缩后的内容与原文字节不同, 强 ETag 改为弱 ETag, 避免缓存把两种编码当成同一份"""
+    return [
+        (n, b"W/" + v if n.lower() == b"etag" and v.startswith(b'"') else v)
+        for n, v in headers
+    ]
+
+
+def _route_options(path: str, routes: dict[str, dict], defaults: dict) -> dict:
+    """最长前缀匹配的路由配置覆盖默认值"""
+    best = ""
+    for prefix in routes:
+        if path.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return {**defaults, **routes[best]} if best else defaults
+
+
+def _is_compressible(headers: list) -> bool:
+    content_type = b""
+    for name, value in headers:
+        lname = name.lower()
+        if lname == b"content-encoding":
+            return False
+        if lname == b"cache-control" and b"no-transform" in value.lower():
+            return False
+        if lname == b"content-type":
+            content_type = value
+    mime = content_type.split(b";", 1)[0].strip().decode("latin1").lower()
+    return mime in COMPRESSIBLE_TYPES
+
+
+def setup_compression_middleware(app, routes: dict[str, dict] | None = None):
+    """设置响应压缩中间件"""
+    original_asgi_app = app.asgi_app
+    defaults = {
+        "enabled": True,
+        "min_size": GetConfigToml("compression", "MIN_SIZE", 1024),
+        "level": GetConfigToml("compression", "LEVEL", 6),
+    }
+    routes = routes or {}
+    encodings = available_encodings()
+
+    async def compression_middleware(scope, receive, send):
+        if scope.get("type") != "http" or scope.get("method") == "HEAD":
+            await original_asgi_app(scope, receive, send)
+            return
+
+        options = _route_options(scope.get("path", ""), routes, defaults)
+        accept = b""
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                accept = value
+                break
+        encoding = negotiate_encoding(accept.decode("latin1"), encodings) if options["enabled"] else "identity"
+        if encoding == "identity":
+            await original_asgi_app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: _Compressor | None = None
+        passthrough = False
+        pending: list[bytes] = []
+        pending_size = 0
+
+        async def compressing_send(message):
+            nonlocal start_message, compressor, passthrough, pending_size
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                assert start_message is not None
+                headers = list(start_message.get("headers", []))
+                if start_message["status"] in (204, 304) or not _is_compressible(headers):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                # Quart 先以 more_body=True 发送正文, 再发一个空的结束块,
+                # 所以要攒够 min_size 字节或等到流结束才能判断是否值得压缩
+                pending.append(body)
+                pending_size += len(body)
+                if more_body and pending_size < options["min_size"]:
+                    return
+                body = b"".join(pending)
+                pending.clear()
+                if not more_body and pending_size < options["min_size"]:
+                    passthrough = True
+                    await send(start_message)
+                    await send({**message, "body": body})
+                    return
+                headers = [(n, v) for n, v in _weaken_etag(headers) if n.lower() != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+                await send({**start_message, "headers": headers})
+                compressor = COMPRESSORS[encoding](options["level"])
+
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body,
+            })
+
+        await original_asgi_app(scope, receive, compressing_send)
+
+    app.asgi_app = compression_middleware
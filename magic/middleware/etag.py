@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from functools import wraps
+from typing import Callable, Sequence
+from quart import request, make_response, Response
+from magic.utils.dataVersion import DataVersion
+
+
+def makeEtag(tag: str | Sequence[str], vary: str = "") -> str:
+    """由一个或多个数据版本号和请求参数生成强 ETag"""
+    tags = (tag,) if isinstance(tag, str) else tuple(tag)
+    versions = "|".join(f"{t}:{DataVersion.get(t)}" for t in tags)
+    digest = hashlib.sha1(f"{versions}:{vary}".encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etagMatches(ifNoneMatch: str, etag: str) -> bool:
+    """If-None-Match 使用弱比较(RFC 9110 13.1.2): 两边都忽略 W/ 前缀"""
+    ifNoneMatch = ifNoneMatch.strip()
+    if ifNoneMatch == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return etag in (t.strip().removeprefix("W/") for t in ifNoneMatch.split(","))
+
+
+def ConditionalGet(tag: str | Sequence[str], varyOn: Callable[[], str] | None = None):
+    """
+    条件 GET 装饰器
+
+    在执行接口(查库、序列化)之前用数据版本号计算 ETag,
+    If-None-Match 命中时直接返回 304.
+
+    Parameter:
+        tag: 数据版本标签, 写操作通过 DataVersion.bump(tag) 使其失效;
+            响应依赖多类数据时传入多个标签, 任何一个 bump 都会让 ETag 失效
+        varyOn: 可选, 返回影响响应内容的请求参数(如查询串、当前用户)
+
+    示例:
+        ```
+        @AuthMiddleware()
+        @ConditionalGet("users", lambda: request.query_string.decode())
+        async def listUsers():
+            ...
+        ```
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            etag = makeEtag(tag, varyOn() if varyOn else "")
+            headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+            ifNoneMatch = request.headers.get("If-None-Match")
+            if ifNoneMatch and etagMatches(ifNoneMatch, etag):
+                return Response(b"", status=304, headers=headers)
+
+            response = await make_response(await func(*args, **kwargs))
+            if response.status_code == 200:
+                response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
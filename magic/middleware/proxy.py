@@ -1,36 +1,134 @@
 # -*- coding: utf-8 -*-
-"""代理头处理中间件"""
+"""
+代理头处理中间件
 
+只有直连地址属于受信任代理网段时才处理转发头. 同时支持 RFC 7239 的
+Forwarded 头(优先)和 X-Forwarded-For / X-Forwarded-Proto.
+从右往左跳过受信任代理, 第一个不受信任的地址即为真实客户端.
 
-def setup_proxy_fix_middleware(app):
+受信任网段通过 config.toml 配置, 默认只信任本机:
+    [server]
+    TRUSTED_PROXIES = ["127.0.0.0/8", "::1/128", "10.0.0.0/8"]
+"""
+import ipaddress
+from functools import lru_cache
+from typing import Iterable
+from magic.utils.TomlConfig import DoesitexistConfigToml
+
+
+DEFAULT_TRUSTED_PROXIES = ("127.0.0.0/8", "::1/128")
+SCHEMES = {"http", "https", "ws", "wss"}
+
+
+def build_trusted_checker(networks: Iterable[str]):
+    """把网段列表预编译为带缓存的判断函数"""
+    v4, v6 = [], []
+    for net in networks:
+        parsed = ipaddress.ip_network(str(net).strip(), strict=False)
+        (v4 if parsed.version == 4 else v6).append(parsed)
+    v4_nets, v6_nets = tuple(v4), tuple(v6)
+
+    @lru_cache(maxsize=4096)
+    def is_trusted(host: str | None) -> bool:
+        if not host:
+            return False
+        if host == "localhost":
+            return any(ipaddress.ip_address("127.0.0.1") in n for n in v4_nets)
+        try:
+            addr = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        if addr.version == 6 and addr.ipv4_mapped is not None:
+            addr = addr.ipv4_mapped
+        return any(addr in n for n in (v4_nets if addr.version == 4 else v6_nets))
+
+    return is_trusted
+
+
+def _strip_node(node: str) -> str:
+    """把 Forwarded 的 for= 节点转换为纯地址: "[2001:db8::1]:80" -> 2001:db8::1"""
+    node = node.strip().strip('"')
+    if node.startswith("["):
+        return node[1:node.find("]")] if "]" in node else node[1:]
+    if node.count(":") == 1:
+        return node.split(":", 1)[0]
+    return node
+
+
+def parse_forwarded(value: str) -> list[tuple[str, str | None]]:
+    """解析 RFC 7239 Forwarded 头, 按顺序返回每一跳的 (for 节点, proto)"""
+    elements: list[tuple[str, str | None]] = []
+    for element in value.split(","):
+        node, proto = "", None
+        for pair in element.split(";"):
+            key, sep, val = pair.partition("=")
+            if not sep:
+                continue
+            key = key.strip().lower()
+            if key == "for":
+                node = _strip_node(val)
+            elif key == "proto":
+                proto = val.strip().strip('"').lower()
+        elements.append((node, proto))
+    return elements
+
+
+def resolve_client(elements: list[tuple[str, str | None]], is_trusted) -> tuple[str | None, str | None]:
+    """从右往左跳过受信任代理, 返回第一个不受信任的 (地址, 该跳的 proto)"""
+    for host, proto in reversed(elements):
+        if not is_trusted(host):
+            # unknown 或混淆标识符(_xxx) 无法作为地址使用
+            if not host or host == "unknown" or host.startswith("_"):
+                return None, proto
+            return host, proto
+    return None, None
+
+
+def setup_proxy_fix_middleware(app, trusted_proxies: Iterable[str] | None = None):
     """设置代理头处理中间件"""
     original_asgi_app = app.asgi_app
+    if trusted_proxies is None:
+        configured = DoesitexistConfigToml("server", "TRUSTED_PROXIES")
+        if isinstance(configured, str):
+            trusted_proxies = configured.split(",")
+        elif isinstance(configured, (list, tuple)):
+            trusted_proxies = [str(network) for network in configured]
+        else:
+            trusted_proxies = DEFAULT_TRUSTED_PROXIES
+    is_trusted = build_trusted_checker(trusted_proxies)
 
     async def proxy_fix_middleware(scope, receive, send):
-        if scope.get("type") == "http":
+        scope_type = scope.get("type")
+        if scope_type in ("http", "websocket"):
             client_addr = scope.get("client")
-            client_host = client_addr[0] if client_addr else None
-
-            if client_host in ("127.0.0.1", "localhost", "::1"):
-                headers = dict(scope.get("headers", []))
-
-                if b"x-forwarded-proto" in headers:
-                    x_forwarded_proto = headers[b"x-forwarded-proto"].decode("latin1").strip()
-                    if x_forwarded_proto in {"http", "https", "ws", "wss"}:
-                        if scope.get("type") == "websocket":
-                            scope["scheme"] = x_forwarded_proto.replace("http", "ws")
-                        else:
-                            scope["scheme"] = x_forwarded_proto
-
-                if b"x-forwarded-for" in headers:
-                    x_forwarded_for = headers[b"x-forwarded-for"].decode("latin1")
-                    if x_forwarded_for:
-                        hosts = [h.strip() for h in x_forwarded_for.split(",")]
-                        if hosts:
-                            for host in reversed(hosts):
-                                if host not in ("127.0.0.1", "localhost", "::1"):
-                                    scope["client"] = (host, 0)
-                                    break
+            if client_addr and is_trusted(client_addr[0]):
+                forwarded = x_forwarded_for = x_forwarded_proto = None
+                for name, value in scope.get("headers", ()):
+                    if name == b"forwarded":
+                        forwarded = value if forwarded is None else forwarded + b"," + value
+                    elif name == b"x-forwarded-for":
+                        x_forwarded_for = value if x_forwarded_for is None else x_forwarded_for + b"," + value
+                    elif name == b"x-forwarded-proto":
+                        x_forwarded_proto = value
+
+                if forwarded is not None:
+                    client, proto = resolve_client(parse_forwarded(forwarded.decode("latin1")), is_trusted)
+                elif x_forwarded_for is not None:
+                    hosts: list[tuple[str, str | None]] = [(_strip_node(h), None) for h in x_forwarded_for.decode("latin1").split(",")]
+                    client, proto = resolve_client(hosts, is_trusted)
+                else:
+                    client, proto = None, None
+                if proto is None and x_forwarded_proto is not None:
+                    proto = x_forwarded_proto.decode("latin1").split(",")[0].strip().lower()
+
+                if proto in SCHEMES:
+                    if scope_type == "websocket":
+                        scope["scheme"] = proto.replace("http", "ws")
+                    else:
+                        scope["scheme"] = proto
+
+                if client:
+                    scope["client"] = (client, 0)
 
         await original_asgi_app(scope, receive, send)
 
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
-from quart import Quart, jsonify, Response, request
+import time
+from quart import Quart, jsonify, Response, request, g
 from typing import Any
 from magic.utils.log3 import logger
+from magic.utils.metrics import HTTP_REQUESTS, HTTP_LATENCY, maybeDumpSnapshot
 
 
 class APIException(Exception):
@@ -20,8 +22,22 @@ class ResponseManager:
     def init_app(self, app: Quart):
         app.register_error_handler(APIException, self._handle_api_exception)
         app.register_error_handler(Exception, self._handle_generic_exception)
+        app.before_request(self._start_timer)
         app.after_request(self._format_response)
 
+    async def _start_timer(self):
+        """记录请求开始时间"""
+        g.requestStartedAt = time.perf_counter()
+
+    def _record_metrics(self, response: Response):
+        """记录请求量与耗时指标"""
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=str(response.status_code))
+        startedAt = g.get("requestStartedAt")
+        if startedAt is not None:
+            HTTP_LATENCY.observe(time.perf_counter() - startedAt, method=request.method, route=route)
+        maybeDumpSnapshot()
+
     async def _handle_api_exception(self, e: APIException):
         """处理已知的业务错误"""
         logger.warning(f"{request.scheme} {request.method} {request.remote_addr} {request.path} - {e.message}")
@@ -35,6 +51,7 @@ class ResponseManager:
     async def _format_response(self, response: Response) -> Response:
         """记录请求并统一响应格式"""
         logger.info(f"{response.status_code} {request.scheme} {request.method} {request.remote_addr} {request.path}")
+        self._record_metrics(response)
         
         if response.status_code == 200 and response.is_json:
             data = await response.get_json()
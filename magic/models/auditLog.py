@@ -0,0 +1,20 @@
+from magic.utils.db.connection import Base
+from sqlalchemy import Column, Integer, String, Text, Index
+
+class AuditLog(Base):
+    """审计日志(只追加, 不更新不删除)"""
+    __tablename__ = "auditlog"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    createdAt = Column(Integer, default=0, nullable=False)
+    actorId = Column(Integer, default=0)       # 操作者 UID, 0 表示系统
+    actorIp = Column(String(64), default="")
+    action = Column(String(32), nullable=False)  # 如 user.delete / role.assign / permission.grant
+    targetType = Column(String(32), default="")
+    targetId = Column(String(64), default="")
+    detail = Column(Text, default="")          # JSON
+
+    __table_args__ = (
+        Index("ixAuditLogCreatedAt", "createdAt"),
+        Index("ixAuditLogTarget", "targetType", "targetId"),
+    )
@@ -0,0 +1,28 @@
+from magic.utils.db.connection import Base
+from sqlalchemy import Column, Integer, String, Index
+
+class AuthSession(Base):
+    """刷新会话, 所有 worker 共享; 只保存 nonce 的哈希, 数据库泄露不会泄露可用的刷新令牌"""
+    __tablename__ = "authsession"
+
+    sid = Column(String(32), primary_key=True)
+    uid = Column(Integer, nullable=False)
+    email = Column(String(150), nullable=False)
+    nonceHash = Column(String(64), nullable=False)  # sha256(nonce), 每次刷新更换
+    expired = Column(Integer, nullable=False)          # 滑动过期时间, 每次刷新顺延
+    absoluteExpired = Column(Integer, nullable=False)  # 绝对过期时间, 到期后必须重新登录
+    createdAt = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ixAuthSessionEmail", "email"),
+        Index("ixAuthSessionExpired", "expired"),
+    )
+
+
+class SigningKey(Base):
+    """访问令牌的签名密钥, 所有 worker 共享, 按 kid 查找"""
+    __tablename__ = "signingkey"
+
+    kid = Column(String(16), primary_key=True)  # 创建时间戳
+    secret = Column(String(64), nullable=False)
+    createdAt = Column(Integer, nullable=False)
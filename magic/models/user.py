@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from magic.utils.db.connection import Base
 from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import relationship
@@ -20,16 +21,13 @@ class User(Base):
         back_populates="user", cascade="all, delete-orphan"
     )
 
+    def getRoleNames(self) -> frozenset[str]:
+        return frozenset(ur.role.name for ur in self.userRoles if ur.role)
+
     def getAllPermissions(self):
-        """获取用户的所有权限"""
-        permissions = set()
-        for userRole in self.userRoles:
-            role = userRole.role
-            if role:
-                for rolePerm in role.permissions:
-                    if rolePerm.permission:
-                        permissions.add(rolePerm.permission.name)
-        return permissions
+        """获取用户的所有权限(通配符授权已展开为具体权限名)"""
+        from magic.service.rbac.policy import POLICY
+        return set(POLICY.permissionsOf(self.getRoleNames()))
     
     def hasPermission(self, permissionName: str):
         """
@@ -41,8 +39,8 @@ class User(Base):
         return:
             bool: 如果拥有该权限返回 True, 否则返回 False
         """
-        allPerms = self.getAllPermissions()
-        return permissionName in allPerms
+        from magic.service.rbac.policy import POLICY
+        return POLICY.allows(self.getRoleNames(), permissionName)
     
     def hasRole(self, roleName: str):
         """
@@ -58,3 +56,43 @@ class User(Base):
             if userRole.role and userRole.role.name == roleName:
                 return True
         return False
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    脱离数据库会话的只读用户快照, 供读缓存使用
+
+    字段名和 hasPermission / hasRole / getAllPermissions 与 User 一致,
+    角色在创建快照时一次性加载; 权限不存入快照, 每次由编译好的策略按角色计算,
+    角色授权变更后无需等待缓存失效.
+    """
+    uid: int
+    name: str
+    mail: str
+    url: str
+    createdAt: int
+    lastLogin: int
+    isActive: int
+    isLoggedIn: int
+    roles: frozenset[str]
+
+    @classmethod
+    def fromUser(cls, user: User) -> "UserSnapshot":
+        return cls(
+            uid=user.uid, name=user.name, mail=user.mail, url=user.url, # pyright: ignore[reportArgumentType]
+            createdAt=user.createdAt, lastLogin=user.lastLogin, # pyright: ignore[reportArgumentType]
+            isActive=user.isActive, isLoggedIn=user.isLoggedIn, # pyright: ignore[reportArgumentType]
+            roles=user.getRoleNames()
+        )
+
+    def getAllPermissions(self):
+        from magic.service.rbac.policy import POLICY
+        return set(POLICY.permissionsOf(self.roles))
+
+    def hasPermission(self, permissionName: str):
+        from magic.service.rbac.policy import POLICY
+        return POLICY.allows(self.roles, permissionName)
+
+    def hasRole(self, roleName: str):
+        return roleName in self.roles
@@ -0,0 +1,5 @@
+from quart import Blueprint
+from magic.controller.backupController import BackupController
+
+bp = Blueprint('backup', __name__, url_prefix='/api/v1/admin')
+bp.add_url_rule('/backup', view_func=BackupController.export, methods=['GET'])
@@ -0,0 +1,5 @@
+from quart import Blueprint
+from magic.controller.dashboardController import DashboardController
+
+bp = Blueprint('dashboard', __name__, url_prefix='/api/v1/admin')
+bp.add_url_rule('/dashboard', view_func=DashboardController.stats, methods=['GET'])
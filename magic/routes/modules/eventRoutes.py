@@ -0,0 +1,5 @@
+from quart import Blueprint
+from magic.controller.eventController import EventController
+
+bp = Blueprint('events', __name__, url_prefix='/api/v1/admin')
+bp.add_url_rule('/events', view_func=EventController.stream, methods=['GET'])
@@ -0,0 +1,5 @@
+from quart import Blueprint
+from magic.controller.logController import LogController
+
+bp = Blueprint('logs', __name__, url_prefix='/api/v1/admin')
+bp.add_url_rule('/logs', view_func=LogController.search, methods=['GET'])
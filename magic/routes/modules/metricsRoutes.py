@@ -0,0 +1,5 @@
+from quart import Blueprint
+from magic.controller.metricsController import MetricsController
+
+bp = Blueprint('metrics', __name__)
+bp.add_url_rule('/metrics', view_func=MetricsController.metrics, methods=['GET'])
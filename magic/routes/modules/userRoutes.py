@@ -3,6 +3,7 @@ from magic.controller.userController import UserController
 
 bp = Blueprint('auth', __name__, url_prefix='/api/v1/auth')
 bp.add_url_rule('/login', view_func=UserController.login, methods=['POST'])
+bp.add_url_rule('/refresh', view_func=UserController.refresh, methods=['POST'])
 bp.add_url_rule('/regter', view_func=UserController.register, methods=['POST'])
 bp.add_url_rule('/email/code/regter', view_func=UserController.sendEmailCodeRegister, methods=['POST'])
 bp.add_url_rule('/user/profile', view_func=UserController.getUserProfile, methods=['GET'])
@@ -3,8 +3,8 @@ import importlib
 import glob
 
 async def combineRoutes(app):
-    modules_dir = os.path.join('magic', 'routes', 'modules')
-    module_files = glob.glob(f"{modules_dir}/*.py")
+    modules_dir = os.path.join(os.path.dirname(__file__), 'modules')
+    module_files = sorted(glob.glob(os.path.join(modules_dir, "*.py")))
     for file in module_files:
         module_name = os.path.basename(file)[:-3]
         if module_name.startswith('_'):
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+异步批量审计日志
+
+PermissionService / UserService 调用 audit() 把事件放进内存队列后立即返回,
+后台任务每隔 FLUSH_INTERVAL 秒或积累 FLUSH_BATCH 条时批量 INSERT 到 auditlog 表,
+管理请求本身不会因为审计多一次同步写入. 服务停止时写出剩余事件.
+事件同时发布到 EVENT_HUB, 供管理后台的事件流实时推送.
+
+队列有上限(MAX_PENDING), 写入跟不上时丢弃最旧的事件并计入
+lmoadll_audit_dropped_total, 排队长度见 lmoadll_audit_pending.
+
+配置项([audit] 段):
+    FLUSH_INTERVAL: 写入间隔(秒), 默认 2
+    FLUSH_BATCH: 单次 INSERT 的最大条数, 同时也是提前写入的阈值, 默认 200
+    MAX_PENDING: 队列上限, 默认 10000
+"""
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict
+from quart import Quart, g, request, has_app_context, has_request_context
+from sqlalchemy import insert
+from magic.models.auditLog import AuditLog
+from magic.utils.db.connection import get_engine, SessionLocal
+from magic.utils.TomlConfig import GetConfigToml
+from magic.utils.forkSafety import registerAfterFork
+from magic.utils.eventHub import EVENT_HUB
+from magic.utils.metrics import Gauge, Counter
+from magic.utils.log3 import logger
+
+
+AUDIT_PENDING = Gauge(
+    "lmoadll_audit_pending", "等待写入的审计事件数"
+)
+AUDIT_WRITTEN = Counter(
+    "lmoadll_audit_written_total", "已写入的审计事件数"
+)
+AUDIT_DROPPED = Counter(
+    "lmoadll_audit_dropped_total", "队列已满被丢弃的审计事件数"
+)
+
+
+@dataclass
+class AuditEvent:
+    createdAt: int
+    actorId: int
+    actorIp: str
+    action: str
+    targetType: str
+    targetId: str
+    detail: str
+
+
+class AuditQueue:
+    def __init__(self):
+        self._events: deque[AuditEvent] = deque()
+        self._lock = threading.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.flushInterval = 2.0
+        self.batchSize = 200
+        self.maxPending = 10000
+
+    def emit(self, event: AuditEvent) -> None:
+        with self._lock:
+            if len(self._events) >= self.maxPending:
+                self._events.popleft()
+                AUDIT_DROPPED.inc()
+            self._events.append(event)
+            full = len(self._events) >= self.batchSize
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._events)
+
+    def flush(self) -> int:
+        """批量写入所有排队的事件(同步, 在线程中调用), 返回写入条数"""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self._events.popleft() for _ in range(min(self.batchSize, len(self._events)))]
+            if not batch:
+                return written
+            try:
+                get_engine()
+                with SessionLocal() as db:
+                    db.execute(insert(AuditLog), [asdict(event) for event in batch])
+                    db.commit()
+            except Exception:
+                with self._lock:
+                    # 放回队首, 但仍受 MAX_PENDING 限制: 数据库长时间不可用时丢弃最旧的事件
+                    self._events.extendleft(reversed(batch))
+                    dropped = max(len(self._events) - self.maxPending, 0)
+                    for _ in range(dropped):
+                        self._events.popleft()
+                if dropped:
+                    AUDIT_DROPPED.inc(dropped)
+                logger.error(f"审计日志写入失败, {len(batch) - dropped} 条已放回队列, 丢弃 {dropped} 条", exc_info=True)
+                return written
+            written += len(batch)
+            AUDIT_WRITTEN.inc(len(batch))
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flushInterval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        self.flushInterval = GetConfigToml("audit", "FLUSH_INTERVAL", 2.0)
+        self.batchSize = max(GetConfigToml("audit", "FLUSH_BATCH", 200), 1)
+        self.maxPending = max(GetConfigToml("audit", "MAX_PENDING", 10000), self.batchSize)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def resetAfterFork(self) -> None:
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._wakeup = None
+        self._task = None
+
+
+AUDIT_QUEUE = AuditQueue()
+AUDIT_PENDING.setFunction(AUDIT_QUEUE.pending)
+registerAfterFork("audit", AUDIT_QUEUE.resetAfterFork)
+
+
+def audit(action: str, targetType: str = "", targetId: object = "", actorId: int | None = None, **detail) -> None:
+    """
+    记录一条审计事件(只入队, 不访问数据库)
+
+    Parameter:
+        action: 事件名, 如 "user.delete"、"role.assign"
+        targetType / targetId: 被操作的对象
+        actorId: 操作者 UID, 默认取当前请求的登录用户, 没有则为 0(系统)
+        **detail: 附加信息, 以 JSON 保存
+
+    示例:
+        ```
+        audit("role.assign", "user", uid, role="admin")
+        ```
+    """
+    actorIp = ""
+    if actorId is None:
+        currentUser = g.get("currentUser") if has_app_context() else None
+        actorId = int(currentUser.uid) if currentUser is not None else 0
+    if has_request_context():
+        actorIp = request.remote_addr or ""
+    createdAt = int(time.time())
+    AUDIT_QUEUE.emit(AuditEvent(
+        createdAt=createdAt,
+        actorId=actorId,
+        actorIp=actorIp,
+        action=action,
+        targetType=targetType,
+        targetId=str(targetId),
+        detail=json.dumps(detail, ensure_ascii=False, default=str) if detail else ""
+    ))
+    # 同时推送给管理后台的事件流(/api/v1/admin/events)
+    EVENT_HUB.publish(action, {
+        "actorId": actorId, "targetType": targetType, "targetId": str(targetId),
+        "createdAt": createdAt, **detail
+    })
+
+
+def setupAuditLog(app: Quart) -> None:
+    """在 Init_module(before_serving) 中调用: 确保 auditlog 表存在并启动写入任务"""
+    AuditLog.__table__.create(bind=get_engine(), checkfirst=True) # pyright: ignore[reportAttributeAccessIssue]
+    AUDIT_QUEUE.start()
+
+    @app.after_serving
+    async def _flushAuditLog():
+        await AUDIT_QUEUE.stop()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+管理后台统计
+
+用户总数、每日注册数、各角色人数常驻内存, 由 UserService / PermissionService
+在写入时增量更新, 仪表盘接口直接读内存, 不再每次 COUNT(*) / GROUP BY.
+后台任务每隔 RECONCILE_INTERVAL 秒用数据库重新计算一次, 纠正增量计数的偏差
+(例如其它 worker 的写入、直接改库). 日期按服务器本地时区划分.
+
+配置项([stats] 段):
+    RECONCILE_INTERVAL: 对账间隔(秒), 默认 300
+    DAYS: 保留的每日注册天数, 默认 30
+"""
+import time
+import asyncio
+import threading
+from datetime import date, timedelta
+from typing import Dict, Iterable
+from quart import Quart
+from sqlalchemy import func
+from magic.models.user import User
+from magic.models.rbac import Role, UserRole
+from magic.utils.db.connection import get_engine, SessionLocal
+from magic.utils.TomlConfig import GetConfigToml
+from magic.utils.forkSafety import registerAfterFork
+from magic.utils.log3 import logger
+
+
+def _utcOffset() -> int:
+    return time.localtime().tm_gmtoff
+
+
+def _dayOf(timestamp: int) -> int:
+    """本地日期对应的天序号(1970-01-01 为 0)"""
+    return (int(timestamp) + _utcOffset()) // 86400
+
+
+class DashboardStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totalUsers = 0
+        self.registrationsByDay: Dict[int, int] = {}
+        self.usersByRole: Dict[str, int] = {}
+        self.reconciledAt = 0
+        self.days = 30
+        self._task: asyncio.Task | None = None
+
+    # --- 增量更新(调用方已在同一事件循环线程中提交事务) ---
+    def userCreated(self, createdAt: int, roles: Iterable[str] = ()) -> None:
+        with self._lock:
+            self.totalUsers += 1
+            day = _dayOf(createdAt)
+            self.registrationsByDay[day] = self.registrationsByDay.get(day, 0) + 1
+            for roleName in roles:
+                self.usersByRole[roleName] = self.usersByRole.get(roleName, 0) + 1
+
+    def userDeleted(self, createdAt: int, roles: Iterable[str] = ()) -> None:
+        with self._lock:
+            self.totalUsers = max(self.totalUsers - 1, 0)
+            day = _dayOf(createdAt)
+            if self.registrationsByDay.get(day):
+                self.registrationsByDay[day] -= 1
+            for roleName in roles:
+                self.usersByRole[roleName] = max(self.usersByRole.get(roleName, 0) - 1, 0)
+
+    def roleAssigned(self, roleName: str) -> None:
+        with self._lock:
+            self.usersByRole[roleName] = self.usersByRole.get(roleName, 0) + 1
+
+    def roleRevoked(self, roleName: str) -> None:
+        with self._lock:
+            self.usersByRole[roleName] = max(self.usersByRole.get(roleName, 0) - 1, 0)
+
+    # --- 对账 ---
+    def reconcile(self) -> None:
+        """从数据库重新计算所有统计(同步, 在线程中调用), 共三次查询"""
+        self.days = max(GetConfigToml("stats", "DAYS", 30), 1)
+        offset = _utcOffset()
+        since = (_dayOf(int(time.time())) - self.days + 1) * 86400 - offset
+        get_engine()
+        with SessionLocal() as db:
+            totalUsers = db.query(func.count(User.uid)).scalar() or 0
+            dayColumn = (User.createdAt + offset) // 86400
+            registrations = db.query(dayColumn, func.count(User.uid)) \
+                .filter(User.createdAt >= since).group_by(dayColumn).all()
+            roles = (
+                db.query(Role.name, func.count(UserRole.id)) # pyright: ignore[reportCallIssue, reportArgumentType]
+                .outerjoin(UserRole, UserRole.roleId == Role.id).group_by(Role.name).all()
+            )
+        with self._lock:
+            self.totalUsers = int(totalUsers)
+            self.registrationsByDay = {int(day): int(count) for day, count in registrations}
+            self.usersByRole = {name: int(count) for name, count in roles}
+            self.reconciledAt = int(time.time())
+
+    def snapshot(self) -> dict:
+        today = _dayOf(int(time.time()))
+        epoch = date(1970, 1, 1)
+        with self._lock:
+            return {
+                "totalUsers": self.totalUsers,
+                "registrationsByDay": [
+                    {"date": (epoch + timedelta(days=day)).isoformat(), "count": self.registrationsByDay.get(day, 0)}
+                    for day in range(today - self.days + 1, today + 1)
+                ],
+                "usersByRole": dict(sorted(self.usersByRole.items())),
+                "reconciledAt": self.reconciledAt,
+            }
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.reconcile)
+            except Exception:
+                logger.error("统计对账失败", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(max(GetConfigToml("stats", "RECONCILE_INTERVAL", 300.0), 1.0)))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def resetAfterFork(self) -> None:
+        self._lock = threading.Lock()
+        self._task = None
+
+
+STATS = DashboardStats()
+registerAfterFork("dashboardStats", STATS.resetAfterFork)
+
+
+def setupDashboardStats(app: Quart) -> None:
+    """在 Init_module(before_serving) 中调用: 启动对账任务(启动后立即执行第一次)"""
+    STATS.start()
+
+    @app.after_serving
+    async def _stopDashboardStats():
+        await STATS.stop()
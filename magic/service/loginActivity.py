@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+登录记录的延迟批量写入
+
+登录时只把 (uid, 时间, IP) 记在内存里, 同一用户只保留最新一条;
+后台任务每隔 FLUSH_INTERVAL 秒或积累 FLUSH_BATCH 条时用一条
+UPDATE ... SET lastLogin = CASE uid WHEN ... END 批量写回 user 表,
+服务停止(after_serving)时写出剩余记录.
+写回后只失效涉及用户的缓存条目并 bump DataVersion("logins"), 不 bump "users":
+登录很频繁, 每次写回都 bump "users" 会让所有 worker 的用户缓存不断失效;
+返回 lastLogin 的接口把 "logins" 也算进 ETag.
+
+配置项([login] 段):
+    FLUSH_INTERVAL: 写回间隔(秒), 默认 5
+    FLUSH_BATCH: 单条 UPDATE 最多包含的用户数, 同时也是提前写回的阈值, 默认 500
+"""
+import time
+import asyncio
+import threading
+from typing import Dict, Tuple
+from quart import Quart
+from sqlalchemy import update, case
+from magic.models.user import User
+from magic.utils.db.connection import get_engine, SessionLocal
+from magic.utils.TomlConfig import GetConfigToml
+from magic.utils.readCache import USER_CACHE
+from magic.utils.dataVersion import DataVersion
+from magic.utils.forkSafety import registerAfterFork
+from magic.utils.metrics import Gauge, Counter
+from magic.utils.log3 import logger
+
+
+LOGIN_PENDING = Gauge(
+    "lmoadll_login_activity_pending", "等待写回的登录记录数"
+)
+LOGIN_FLUSHED = Counter(
+    "lmoadll_login_activity_flushed_total", "已写回的登录记录数"
+)
+
+
+class LoginActivityBuffer:
+    def __init__(self):
+        self._pending: Dict[int, Tuple[int, str]] = {}  # uid -> (登录时间, IP)
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()  # 停止时的最后一次写回要等后台线程中的写回结束
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.flushInterval = 5.0
+        self.batchSize = 500
+
+    def record(self, uid: int, ip: str = "", timestamp: int | None = None) -> None:
+        """记录一次登录, 不访问数据库"""
+        with self._lock:
+            self._pending[uid] = (timestamp or int(time.time()), ip)
+            full = len(self._pending) >= self.batchSize
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """把缓冲区写回数据库(同步, 在线程中调用), 返回写回的用户数"""
+        with self._flushLock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            entries, self._pending = self._pending, {}
+        if not entries:
+            return 0
+
+        items = sorted(entries.items())
+        try:
+            get_engine()
+            with SessionLocal() as db:
+                for start in range(0, len(items), self.batchSize):
+                    chunk = dict(items[start:start + self.batchSize])
+                    ipMap = {uid: ip for uid, (_, ip) in chunk.items() if ip}
+                    values = {
+                        User.lastLogin: case({uid: ts for uid, (ts, _) in chunk.items()}, value=User.uid),
+                        User.isLoggedIn: 1,
+                    }
+                    if ipMap:
+                        values[User.url] = case(ipMap, value=User.uid, else_=User.url)
+                    db.execute(update(User).where(User.uid.in_(chunk)).values(values))
+                db.commit()
+        except Exception:
+            # 写回失败时放回缓冲区, 不覆盖期间产生的更新记录
+            with self._lock:
+                for uid, entry in entries.items():
+                    self._pending.setdefault(uid, entry)
+            logger.error(f"登录记录写回失败, {len(entries)} 条已放回缓冲区", exc_info=True)
+            return 0
+
+        USER_CACHE.invalidate(*(f"user:{uid}" for uid in entries))
+        DataVersion.bump("logins")
+        LOGIN_FLUSHED.inc(len(entries))
+        return len(entries)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flushInterval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        """在当前事件循环上启动后台写回任务"""
+        self.flushInterval = GetConfigToml("login", "FLUSH_INTERVAL", 5.0)
+        self.batchSize = max(GetConfigToml("login", "FLUSH_BATCH", 500), 1)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务并写出剩余记录"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        flushed = await asyncio.to_thread(self.flush)
+        if flushed:
+            logger.info(f"停止前写回 {flushed} 条登录记录")
+
+    def resetAfterFork(self) -> None:
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._pending = {}
+        self._wakeup = None
+        self._task = None
+
+
+LOGIN_ACTIVITY = LoginActivityBuffer()
+LOGIN_PENDING.setFunction(LOGIN_ACTIVITY.pending)
+registerAfterFork("loginActivity", LOGIN_ACTIVITY.resetAfterFork)
+
+
+def setupLoginActivity(app: Quart) -> None:
+    """在 Init_module(before_serving) 中调用: 启动写回任务, 停止服务时写出剩余记录"""
+    LOGIN_ACTIVITY.start()
+
+    @app.after_serving
+    async def _flushLoginActivity():
+        await LOGIN_ACTIVITY.stop()
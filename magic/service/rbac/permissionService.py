@@ -1,6 +1,12 @@
-from magic.utils.db.connection import get_db
+from magic.utils.db.connection import get_db, get_read_db
+from magic.utils.dataVersion import DataVersion
+from magic.utils.readCache import USER_CACHE
+from magic.service.rbac.policy import POLICY
+from magic.service.audit import audit
+from magic.service.dashboardStats import STATS
 from magic.models.rbac import Role, Permission, UserRole, RolePermission
 from magic.models.user import User
+from sqlalchemy.exc import IntegrityError
 from typing import List
 
 class PermissionService:
@@ -28,8 +34,14 @@ class PermissionService:
         if not role:
             role = Role(name=roleName, description=description)
             db.add(role)
-            db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                # 多个 worker 同时初始化 RBAC 时, 其它 worker 已经创建了同名角色
+                db.rollback()
+                return db.query(Role).filter_by(name=roleName).one()
             db.refresh(role)
+            POLICY.bump()
         return role
 
     @staticmethod
@@ -50,8 +62,13 @@ class PermissionService:
         if not perm:
             perm = Permission(name=permissionName, description=description, category=category)
             db.add(perm)
-            db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # 同 getOrCreateRole, 其它 worker 已经创建
+                return db.query(Permission).filter_by(name=permissionName).one()
             db.refresh(perm)
+            POLICY.bump()
         return perm
 
     @staticmethod
@@ -86,6 +103,10 @@ class PermissionService:
         userRole = UserRole(userId=userId, roleId=role.id, grantedBy=grantedBy)  # pyright: ignore[reportArgumentType]
         db.add(userRole)
         db.commit()
+        audit("role.assign", "user", userId, actorId=grantedBy or None, role=roleName)
+        STATS.roleAssigned(roleName)
+        USER_CACHE.invalidate(f"user:{userId}")
+        DataVersion.bump("users")
         return True
     
     @staticmethod
@@ -116,6 +137,10 @@ class PermissionService:
         if userRole:
             db.delete(userRole)
             db.commit()
+            audit("role.revoke", "user", userId, role=roleName)
+            STATS.roleRevoked(roleName)
+            USER_CACHE.invalidate(f"user:{userId}")
+            DataVersion.bump("users")
         
         return True
 
@@ -150,7 +175,13 @@ class PermissionService:
         
         rolePerm = RolePermission(roleId=role.id, permissionId=permission.id)  # pyright: ignore[reportArgumentType]
         db.add(rolePerm)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # 其它 worker 同时授予了同一权限
+            return True
+        audit("permission.grant", "role", roleName, permission=permissionName)
+        POLICY.bump()
         return True
 
     @staticmethod
@@ -182,6 +213,8 @@ class PermissionService:
         if rolePerm:
             db.delete(rolePerm)
             db.commit()
+            audit("permission.revoke", "role", roleName, permission=permissionName)
+            POLICY.bump()
         
         return True
     
@@ -196,12 +229,7 @@ class PermissionService:
         return:
             List[str]: 权限名称列表
         """
-        db = get_db()
-        user = db.query(User).filter_by(uid=userId).first()
-        if not user:
-            return []
-        
-        return list(user.getAllPermissions())
+        return POLICY.permissionsOf(PermissionService._userRoles(userId))
 
     @staticmethod
     def checkUserPermission(userId: int, permissionName: str) -> bool:
@@ -215,9 +243,10 @@ class PermissionService:
         return:
             bool: 拥有该权限返回 True, 否则返回 False
         """
-        db = get_db()
-        user = db.query(User).filter_by(uid=userId).first()
-        if not user:
-            return False
-        
-        return user.hasPermission(permissionName)
+        return POLICY.allows(PermissionService._userRoles(userId), permissionName)
+
+    @staticmethod
+    def _userRoles(userId: int) -> frozenset[str]:
+        db = get_read_db()
+        query = db.query(Role.name).join(UserRole, UserRole.roleId == Role.id).filter(UserRole.userId == userId) # pyright: ignore[reportCallIssue, reportArgumentType]
+        return frozenset(name for (name,) in query.all())
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+位掩码 RBAC 策略
+
+把 role / permission / rolePermission 三张表编译成内存中的策略:
+每个权限分配一个位, 每个角色是其权限位的或, 用户的掩码是其角色掩码的或,
+权限检查只需要一次按位与. 授予角色的权限名可以使用通配符:
+    "post:*"  匹配所有 post: 开头的权限
+    "*"       匹配所有权限
+通配符在编译时展开为具体的权限位; 名字带 * 的权限行只作为授予模式, 本身不分配位,
+因此 permissionsOf 只返回具体权限名.
+
+策略版本号保存在 DataVersion("rbac"), 角色或权限变更时 bump,
+每个 worker 每隔 [rbac] POLICY_CHECK_INTERVAL 秒(默认 1)检查一次版本号, 变化后重新编译.
+"""
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from magic.models.rbac import Role, Permission, RolePermission
+from magic.utils.db.connection import get_engine, SessionLocal
+from magic.utils.dataVersion import DataVersion
+from magic.utils.TomlConfig import GetConfigToml
+from magic.utils.log3 import logger
+
+
+POLICY_TAG = "rbac"
+
+
+def matchPermission(pattern: str, permissionName: str) -> bool:
+    """权限名是否匹配授予的模式(支持末尾通配符)"""
+    if pattern in ("*", "*:*"):
+        return True
+    if pattern.endswith("*"):
+        return permissionName.startswith(pattern[:-1])
+    return pattern == permissionName
+
+
+@dataclass
+class CompiledPolicy:
+    version: str
+    bits: Dict[str, int]       # 权限名 -> 位
+    roleMasks: Dict[str, int]  # 角色名 -> 掩码
+    _userMasks: Dict[FrozenSet[str], int] = field(default_factory=dict)
+
+    @classmethod
+    def compile(cls, version: str, permissions: Iterable[str], grants: Iterable[Tuple[str, str]]) -> "CompiledPolicy":
+        """
+        Parameter:
+            permissions: 所有权限名(带 * 的通配符行不分配位)
+            grants: (角色名, 授予的权限名或通配符)
+        """
+        concrete = sorted({name for name in permissions if "*" not in name})
+        bits = {name: 1 << index for index, name in enumerate(concrete)}
+        roleMasks: Dict[str, int] = {}
+        for roleName, pattern in grants:
+            mask = roleMasks.get(roleName, 0)
+            if "*" in pattern:
+                for name, bit in bits.items():
+                    if matchPermission(pattern, name):
+                        mask |= bit
+            else:
+                mask |= bits.get(pattern, 0)
+            roleMasks[roleName] = mask
+        return cls(version, bits, roleMasks)
+
+    def maskFor(self, roles: FrozenSet[str]) -> int:
+        """用户掩码(按角色组合缓存)"""
+        mask = self._userMasks.get(roles)
+        if mask is None:
+            mask = 0
+            for roleName in roles:
+                mask |= self.roleMasks.get(roleName, 0)
+            self._userMasks[roles] = mask
+        return mask
+
+    def allows(self, roles: FrozenSet[str], permissionName: str) -> bool:
+        bit = self.bits.get(permissionName)
+        return bit is not None and self.maskFor(roles) & bit == bit
+
+    def permissionsOf(self, roles: FrozenSet[str]) -> List[str]:
+        """角色组合拥有的所有具体权限名(通配符已展开), 按名称排序"""
+        mask = self.maskFor(roles)
+        return [name for name, bit in self.bits.items() if mask & bit]
+
+
+class PolicyEngine:
+    """持有当前编译好的策略, 版本号变化时重新编译"""
+
+    def __init__(self):
+        self._policy: CompiledPolicy | None = None
+        self._checkedAt = 0.0
+        self._checkInterval: float | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load() -> Tuple[List[str], List[Tuple[str, str]]]:
+        """从数据库读取权限名和(角色, 权限)授予关系, 只需两次查询"""
+        get_engine()
+        with SessionLocal() as db:
+            permissions = [name for (name,) in db.query(Permission.name).all()] # pyright: ignore[reportCallIssue, reportArgumentType]
+            grants = (
+                db.query(Role.name, Permission.name) # pyright: ignore[reportCallIssue, reportArgumentType]
+                .join(RolePermission, RolePermission.roleId == Role.id)
+                .join(Permission, Permission.id == RolePermission.permissionId)
+                .all()
+            )
+        return permissions, [(roleName, permName) for roleName, permName in grants]
+
+    def reload(self) -> CompiledPolicy:
+        with self._lock:
+            version = DataVersion.get(POLICY_TAG)
+            permissions, grants = self.load()
+            self._policy = CompiledPolicy.compile(version, permissions, grants)
+            self._checkedAt = time.monotonic()
+        logger.info(f"RBAC 策略已编译: {len(self._policy.bits)} 个权限, {len(self._policy.roleMasks)} 个角色")
+        return self._policy
+
+    def current(self) -> CompiledPolicy:
+        policy = self._policy
+        if policy is None:
+            return self.reload()
+        now = time.monotonic()
+        if self._checkInterval is None:
+            self._checkInterval = GetConfigToml("rbac", "POLICY_CHECK_INTERVAL", 1.0)
+        if now - self._checkedAt >= self._checkInterval:
+            self._checkedAt = now
+            if DataVersion.get(POLICY_TAG) != policy.version:
+                return self.reload()
+        return policy
+
+    def allows(self, roles: FrozenSet[str], permissionName: str) -> bool:
+        return self.current().allows(roles, permissionName)
+
+    def permissionsOf(self, roles: FrozenSet[str]) -> List[str]:
+        return self.current().permissionsOf(roles)
+
+    def bump(self) -> None:
+        """角色或权限变更后调用, 本进程下次使用时立即重新编译, 其它 worker 在下次检查时重新编译"""
+        DataVersion.bump(POLICY_TAG)
+        self._checkedAt = 0.0
+
+
+POLICY = PolicyEngine()
@@ -1,20 +1,102 @@
-from magic.models.user import User
-from magic.utils.db.connection import get_db
-from magic.utils.Argon2Password import verifyPassword
-from magic.utils.jwt import generateLoginToken
+from magic.models.user import User, UserSnapshot
+from magic.models.rbac import Role, UserRole
+from magic.utils.db.connection import get_db, get_read_db, get_engine, SessionLocal
+from magic.utils.Argon2Password import verifyPassword, needsRehash, hashPassword
+from magic.utils.metrics import ARGON2_REHASHES
+from magic.utils.log3 import logger
+from magic.utils.jwt import issueLoginTokens, revokeUserTokens
+from magic.utils.dataVersion import DataVersion
+from magic.utils.readCache import USER_CACHE
 from magic.service.rbac.permissionService import PermissionService
+from magic.service.rbac.policy import POLICY
+from magic.service.loginActivity import LOGIN_ACTIVITY
+from magic.service.audit import audit
+from magic.service.dashboardStats import STATS
 from sqlalchemy import or_
 from typing import cast
+import asyncio
 import time
 
 
+_backgroundTasks: set[asyncio.Task] = set()
+
+
+def userTags(uid: int | None = None, email: str | None = None, name: str | None = None) -> list[str]:
+    """用户缓存条目的失效标签; 未命中(None)的条目按查询条件打标签, 新建同名用户时失效"""
+    tags = []
+    if uid is not None:
+        tags.append(f"user:{uid}")
+    if email:
+        tags.append(f"email:{email}")
+    if name:
+        tags.append(f"name:{name}")
+    return tags
+
+
+async def _rehashPassword(uid: int, oldHash: str, password: str) -> None:
+    """用当前 Argon2 参数重新计算哈希; 期间密码被修改过则放弃写入"""
+    try:
+        newHash = await asyncio.to_thread(hashPassword, password)
+        if not newHash:
+            ARGON2_REHASHES.inc(result="failed")
+            return
+
+        def _write() -> int:
+            get_engine()
+            with SessionLocal() as db:
+                updated = db.query(User).filter(User.uid == uid, User.password == oldHash) \
+                    .update({User.password: newHash}, synchronize_session=False)
+                db.commit()
+                return updated
+
+        updated = await asyncio.to_thread(_write)
+        ARGON2_REHASHES.inc(result="upgraded" if updated else "skipped")
+    except Exception:
+        ARGON2_REHASHES.inc(result="failed")
+        logger.error(f"用户 {uid} 的密码哈希升级失败", exc_info=True)
+
+
 class UserService:
     @staticmethod
     async def getUserByEmail(email: str) -> User | None:
         return get_db().query(User).filter(User.mail == email).first()
+
+    @staticmethod
+    async def emailExists(email: str) -> bool:
+        """
+        注册时的邮箱唯一性检查
+
+        不走读缓存也不走只读副本: 缓存或副本中过期的 "不存在" 会放过重复注册
+        """
+        return get_db().query(User.uid).filter(User.mail == email).first() is not None
+
+    @staticmethod
+    async def getUserById(uid: int) -> UserSnapshot | None:
+        """
+        按 UID 查询用户(含角色和权限), 供 getCurrentUser 使用
+
+        缓存从主库加载: 失效后从延迟的副本重新加载, 会把刚撤销的角色再缓存一个 TTL
+        """
+        def _load():
+            user = get_db().query(User).filter(User.uid == uid).first()
+            return UserSnapshot.fromUser(user) if user else None
+        return USER_CACHE.getOrLoad(
+            ("uid", uid), _load,
+            lambda u: userTags(u.uid, u.mail, u.name) if u else userTags(uid)
+        )
     
     @staticmethod
-    async def createUser(name: str, email: str, password: str, ip: str = "") -> User:
+    async def createUser(name: str, email: str, password: str, ip: str = "", roleName: str = "user") -> User:
+        """
+        创建用户并分配默认角色
+
+        用户和角色关联在同一个事务中写入, 只提交一次.
+        会话使用 expire_on_commit=False, 提交后返回的对象可以直接读取 uid 等字段, 无需 refresh.
+
+        Parameter:
+            password: 已经过 hashPassword 处理的密码哈希
+            roleName: 默认角色, 角色不存在时只创建用户
+        """
         db = get_db()
         new_user = User(
             name=name,
@@ -27,16 +109,24 @@ class UserService:
             isLoggedIn=0
         )
         db.add(new_user)
+        db.flush()  # 取得自增 uid
+
+        role = db.query(Role).filter_by(name=roleName).first()
+        if role:
+            db.add(UserRole(userId=cast(int, new_user.uid), roleId=cast(int, role.id)))
         db.commit()
-        db.refresh(new_user)
-        
-        PermissionService.assignRoleToUser(new_user.uid, "user")  # pyright: ignore[reportArgumentType]
+        audit("user.create", "user", new_user.uid, email=email, name=name, role=roleName if role else None)
+        STATS.userCreated(cast(int, new_user.createdAt), [roleName] if role else [])
+        USER_CACHE.invalidate(*userTags(email=email, name=name))
+        DataVersion.bump("users")
         
         return new_user
     
     @staticmethod
-    async def loginUser(email: str, password: str):
+    async def loginUser(email: str, password: str, ip: str = ""):
         """
+        登录时间和 IP 记入 LOGIN_ACTIVITY, 由后台任务批量写回, 不在登录请求中提交
+
         return:
             - 成功: 返回用户信息字典(包括权限)
             - 失败: 返回错误码
@@ -48,20 +138,27 @@ class UserService:
         isCorrectPassword = verifyPassword(str(user.password), password)
 
         if isCorrectPassword:
-            token = await generateLoginToken(
+            if needsRehash(str(user.password)):
+                task = asyncio.create_task(_rehashPassword(cast(int, user.uid), str(user.password), password))
+                _backgroundTasks.add(task)
+                task.add_done_callback(_backgroundTasks.discard)
+
+            LOGIN_ACTIVITY.record(cast(int, user.uid), ip)
+            token, refreshToken = await issueLoginTokens(
                 cast(int, user.uid),
                 cast(str, user.mail)
             )
 
-            permissions = list(user.getAllPermissions())
+            roles = user.getRoleNames()
             
             userInfo = {
                 "uid": user.uid,
                 "name": user.name,
                 "email": user.mail,
-                "roles": [ur.role.name for ur in user.userRoles if ur.role],
-                "permissions": permissions,
-                "token": token
+                "roles": sorted(roles),
+                "permissions": POLICY.permissionsOf(roles),
+                "token": token,
+                "refreshToken": refreshToken
             }
 
             return userInfo
@@ -71,7 +168,7 @@ class UserService:
     @staticmethod
     async def getUsersList():
         """获取用户列表"""
-        users = get_db().query(User).all()
+        users = get_read_db().query(User).all()
         return [
             {
                 "uid": user.uid, 
@@ -112,11 +209,13 @@ class UserService:
 
     @staticmethod
     async def updateUser(uid: int, data: dict):
-        """更新用户信息"""
+        """更新用户信息, data 中的 password 须为 hashPassword 处理后的哈希"""
         db = get_db()
         user = db.query(User).filter(User.uid == uid).first()
         if not user:
             return False
+        oldEmail = cast(str, user.mail)
+        oldName = cast(str, user.name)
         
         if data.get("username"):
             user.name = data["username"]
@@ -127,6 +226,14 @@ class UserService:
         
         user.updated_at = int(time.time())
         db.commit()
+        audit("user.update", "user", uid, fields=[key for key in ("username", "email", "password") if data.get(key)])
+        if data.get("email") or data.get("password"):
+            await revokeUserTokens(oldEmail)  # 刷新接口不查库, 凭据变更后必须撤销旧会话
+        USER_CACHE.invalidate(
+            *userTags(uid, oldEmail, oldName),
+            *userTags(email=data.get("email"), name=data.get("username"))
+        )
+        DataVersion.bump("users")
         return True
     
     @staticmethod
@@ -137,28 +244,40 @@ class UserService:
         if not user:
             return False
         
+        email = cast(str, user.mail)
+        name = cast(str, user.name)
+        createdAt = cast(int, user.createdAt)
+        roles = [ur.role.name for ur in user.userRoles if ur.role]
         db.delete(user)
         db.commit()
+        STATS.userDeleted(createdAt, roles)
+        audit("user.delete", "user", uid, email=email, name=name)
+        await revokeUserTokens(email)
+        USER_CACHE.invalidate(*userTags(uid, email, name))
+        DataVersion.bump("users")
         return True
 
     @staticmethod
     async def getUserByUsernameExactly(username: str) -> dict | None:
-        """精确查询用户名, 完全匹配"""
-        db = get_db()
-        user = db.query(User).filter(User.name == username).first()
-        if not user:
-            return None
-        
-        return {
-            "uid": user.uid, "name": user.name,
-            "email": user.mail,
-            "createdAt": user.createdAt, "lastLogin": user.lastLogin
-        }
+        """精确查询用户名, 完全匹配(缓存从主库加载, 同 getUserById)"""
+        def _load():
+            user = get_db().query(User).filter(User.name == username).first()
+            if not user:
+                return None
+            return {
+                "uid": user.uid, "name": user.name,
+                "email": user.mail,
+                "createdAt": user.createdAt, "lastLogin": user.lastLogin
+            }
+        return USER_CACHE.getOrLoad(
+            ("nameExactly", username), _load,
+            lambda u: userTags(u["uid"], u["email"], u["name"]) if u else userTags(name=username)
+        )
 
     @staticmethod
     async def getUserByUsername(username: str) -> list[dict]:
         """模糊查询用户名, 包含匹配"""
-        db = get_db()
+        db = get_read_db()
         users = db.query(User).filter(User.name.contains(username)).all()
         
         return [{
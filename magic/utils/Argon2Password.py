@@ -8,26 +8,67 @@
 
 该模块提供密码哈希和验证功能, 基于Argon2密码哈希算法,
 用于在应用程序中安全地存储和验证用户密码.
+
+参数保存在 config.toml 的 [argon2] 段(TIME_COST / MEMORY_COST / PARALLELISM),
+可以用 `python -m magic.utils.Argon2Password --save` 按本机硬件校准后写入.
+已有哈希仍可验证, 登录时通过 needsRehash 判断并在后台升级为新参数.
 """
 
+import os
+import time
+import argparse
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
+from magic.utils.metrics import ARGON2_INFLIGHT
+from magic.utils.TomlConfig import GetConfigToml, WriteConfigToml
 import logging
 
 
 
 __all__ = [
     'hashPassword', 
-    'verifyPassword'
+    'verifyPassword',
+    'needsRehash',
+    'calibrate'
 ]
 
-ph = PasswordHasher(
-    time_cost=2,         # 迭代次数，推荐2-4
-    memory_cost=102400,  # 内存开销（单位KB，如100MB）
-    parallelism=2,       # 并行线程数
-    hash_len=32,         # 输出哈希长度（字节）
-    salt_len=16          # 盐值长度（字节）
-)
+DEFAULT_PARAMETERS = {
+    "TIME_COST": 2,         # 迭代次数，推荐2-4
+    "MEMORY_COST": 102400,  # 内存开销（单位KB，如100MB）
+    "PARALLELISM": 2,       # 并行线程数
+}
+MIN_MEMORY_COST = 19456  # OWASP 建议的下限(19 MiB)
+
+_ph: PasswordHasher | None = None
+
+
+def buildHasher(timeCost: int, memoryCost: int, parallelism: int) -> PasswordHasher:
+    return PasswordHasher(
+        time_cost=timeCost,
+        memory_cost=memoryCost,
+        parallelism=parallelism,
+        hash_len=32,         # 输出哈希长度（字节）
+        salt_len=16          # 盐值长度（字节）
+    )
+
+
+def loadParameters() -> dict:
+    """读取 [argon2] 段, 缺省项使用 DEFAULT_PARAMETERS"""
+    return {key: GetConfigToml("argon2", key, default) for key, default in DEFAULT_PARAMETERS.items()}
+
+
+def getHasher() -> PasswordHasher:
+    global _ph
+    if _ph is None:
+        params = loadParameters()
+        _ph = buildHasher(params["TIME_COST"], params["MEMORY_COST"], params["PARALLELISM"])
+    return _ph
+
+
+def reloadHasher() -> None:
+    """配置变更后丢弃缓存的 PasswordHasher, 下次使用时按新参数创建"""
+    global _ph
+    _ph = None
 
 
 def hashPassword(password: str):
@@ -37,7 +78,11 @@ def hashPassword(password: str):
             print("密码必须是非空字符串")
             return None
         
-        pw_hash = ph.hash(password)
+        ARGON2_INFLIGHT.inc()
+        try:
+            pw_hash = getHasher().hash(password)
+        finally:
+            ARGON2_INFLIGHT.dec()
         return pw_hash
     except Exception as e:
         logging.error(f"哈希处理失败: {e}")
@@ -51,9 +96,92 @@ def verifyPassword(pw_hash: str, password: str):
             print("哈希值和密码必须是非空的")
             return False
             
-        return ph.verify(pw_hash, password)
+        ARGON2_INFLIGHT.inc()
+        try:
+            return getHasher().verify(pw_hash, password)
+        finally:
+            ARGON2_INFLIGHT.dec()
     except VerifyMismatchError:
         return False
     except Exception as e:
         logging.error(f"验证过程中出现错误喵: {e}")
         return False
+
+
+def needsRehash(pw_hash: str) -> bool:
+    """哈希使用的参数与当前配置不同时返回 True"""
+    try:
+        return getHasher().check_needs_rehash(pw_hash)
+    except Exception:
+        return False
+
+
+def _measure(hasher: PasswordHasher, rounds: int = 3) -> float:
+    """返回多次哈希中最快的一次耗时(毫秒)"""
+    best = float("inf")
+    for _ in range(rounds):
+        startedAt = time.perf_counter()
+        hasher.hash("calibration-password-123")
+        best = min(best, time.perf_counter() - startedAt)
+    return best * 1000
+
+
+def calibrate(targetMs: float = 250, maxMemoryKiB: int = 65536, parallelism: int | None = None) -> dict:
+    """
+    按本机硬件选择 Argon2 参数
+
+    先在内存预算内用 time_cost=1 测量, 超出耗时目标就减半内存(不低于 MIN_MEMORY_COST),
+    否则在不超过目标的前提下逐步增加 time_cost.
+
+    Parameter:
+        targetMs: 单次哈希的目标耗时(毫秒)
+        maxMemoryKiB: 单次哈希允许使用的内存(KiB)
+        parallelism: 并行度, 默认取 CPU 核数与 2 的较小值
+
+    return:
+        dict: TIME_COST / MEMORY_COST / PARALLELISM 以及实测耗时 MEASURED_MS
+    """
+    parallelism = parallelism or min(os.cpu_count() or 1, 2)
+    memoryCost = max(maxMemoryKiB, MIN_MEMORY_COST)
+    timeCost = 1
+    elapsed = _measure(buildHasher(timeCost, memoryCost, parallelism))
+    while elapsed > targetMs and memoryCost // 2 >= MIN_MEMORY_COST:
+        memoryCost //= 2
+        elapsed = _measure(buildHasher(timeCost, memoryCost, parallelism))
+
+    while True:
+        candidate = _measure(buildHasher(timeCost + 1, memoryCost, parallelism))
+        if candidate > targetMs:
+            break
+        timeCost += 1
+        elapsed = candidate
+
+    return {
+        "TIME_COST": timeCost,
+        "MEMORY_COST": memoryCost,
+        "PARALLELISM": parallelism,
+        "MEASURED_MS": round(elapsed, 1),
+    }
+
+
+def saveParameters(params: dict) -> None:
+    """把校准结果写入 config.toml 的 [argon2] 段并立即生效"""
+    for key in DEFAULT_PARAMETERS:
+        WriteConfigToml("argon2", key, int(params[key]))
+    reloadHasher()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按本机硬件校准 Argon2 参数")
+    parser.add_argument("--target-ms", type=float, default=250, help="单次哈希目标耗时(毫秒)")
+    parser.add_argument("--max-memory-mb", type=int, default=64, help="单次哈希内存上限(MiB)")
+    parser.add_argument("--parallelism", type=int, default=None)
+    parser.add_argument("--save", action="store_true", help="写入 config.toml 的 [argon2] 段")
+    args = parser.parse_args()
+
+    result = calibrate(args.target_ms, args.max_memory_mb * 1024, args.parallelism)
+    print(f"time_cost={result['TIME_COST']} memory_cost={result['MEMORY_COST']}KiB "
+          f"parallelism={result['PARALLELISM']} 实测 {result['MEASURED_MS']}ms")
+    if args.save:
+        saveParameters(result)
+        print("已写入 config.toml [argon2], 旧哈希会在用户下次登录时自动升级")
@@ -5,6 +5,7 @@ import logging
 from email.mime.text import MIMEText
 from email.utils import formataddr
 from magic.utils.TomlConfig import GLOBAL_CONFIG, load_global_config
+from magic.utils.metrics import MAIL_QUEUE_DEPTH
 
 def sendMailSync(subject: str, receivers: list[str], html: str) -> bool:
     """同步发送邮件的核心逻辑"""
@@ -32,4 +33,8 @@ def sendMailSync(subject: str, receivers: list[str], html: str) -> bool:
 
 async def sendMailAsync(subject: str, receivers: list[str], html: str) -> bool:
     """异步发送邮件接口"""
-    return await asyncio.to_thread(sendMailSync, subject, receivers, html)
+    MAIL_QUEUE_DEPTH.inc()
+    try:
+        return await asyncio.to_thread(sendMailSync, subject, receivers, html)
+    finally:
+        MAIL_QUEUE_DEPTH.dec()
@@ -4,19 +4,22 @@
 #@copyright  Copyright (c) 2025 lmoadll_bl team
 #@license  GNU General Public License 3.0
 """用于处理 TOML 配置文件的读取和写入操作"""
+import os
 import tomllib
 import pathlib
 from tomli_w import dump
-from typing import Union, Dict
+from typing import Union, Dict, TypeVar
 
 
 CONFIG_PATH = pathlib.Path(__file__).parent.parent.parent / "config.toml"
 GLOBAL_CONFIG: Dict[str, Dict[str, Union[str, int, bool]]] = {}
+T = TypeVar("T", str, int, float, bool)
 
 
 __all__ = [
     "check_config_file",
     "DoesitexistConfigToml",
+    "GetConfigToml",
     "WriteConfigToml",
     "load_global_config",
     "GLOBAL_CONFIG"
@@ -60,6 +63,35 @@ def DoesitexistConfigToml(a: str, b: str):
     return False
 
 
+def GetConfigToml(a: str, b: str, default: T, env: str | None = None) -> T:
+    """
+    读取配置项并转换为 default 的类型
+
+    配置项不存在或无法转换时返回 default; 给出 env 时同名环境变量优先.
+    与 DoesitexistConfigToml 不同, 配置为 false 的布尔项会如实返回 False.
+
+    示例:
+        ```
+        interval = GetConfigToml("audit", "FLUSH_INTERVAL", 2.0)
+        workers = GetConfigToml("server", "WORKERS", 1, env="WEB_CONCURRENCY")
+        ```
+    """
+    value = os.getenv(env) if env else None
+    if value is None:
+        if not GLOBAL_CONFIG:
+            load_global_config()
+        section = GLOBAL_CONFIG.get(a, {})
+        if b not in section:
+            return default
+        value = section[b]
+    if isinstance(default, bool):
+        return str(value).lower() in ("true", "1", "t", "yes")  # pyright: ignore[reportReturnType]
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        return default
+
+
 def WriteConfigToml(a: str, b: str, c: Union[str, int, bool]) -> None:
     """检查键并写入配置文件"""
     # 确保全局配置已加载
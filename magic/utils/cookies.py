@@ -1,5 +1,8 @@
 from typing import Optional, Any
-from magic.utils.jwt import verifyJwtPayload
+from magic.utils.jwt import verifyJwtPayload, accessTokenSeconds, refreshTokenSeconds
+
+REFRESH_COOKIE = 'forestwhisper_refresh'
+REFRESH_COOKIE_PATH = '/api/v1/auth/refresh'
 
 
 def setCookieToken(response: Any, token: str) -> None:
@@ -7,10 +10,21 @@ def setCookieToken(response: Any, token: str) -> None:
         'forestwhisper',
         token,
         httponly=True,
-        max_age=7 * 24 * 60 * 60,
+        max_age=accessTokenSeconds(),
         samesite='Lax'
     )
 
+def setRefreshCookie(response: Any, token: str) -> None:
+    """刷新令牌只发送给刷新接口"""
+    response.set_cookie(
+        REFRESH_COOKIE,
+        token,
+        httponly=True,
+        max_age=refreshTokenSeconds(),
+        path=REFRESH_COOKIE_PATH,
+        samesite='Strict'
+    )
+
 def getCookieToken(ctx: Any) -> Optional[Any]:
     refresh_token = ctx.cookies.get('forestwhisper')
     if not refresh_token:
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+数据版本号
+
+为一类数据(例如 "users")维护一个版本号, 写操作时 bump, 读接口用它生成 ETag.
+版本号保存在 contents/cache/<tag>.version 中, 同一台机器上的所有 worker 共享,
+任何一个 worker 的写入都会让其它 worker 的 ETag 失效; 读取只需要一次小文件读.
+"""
+import os
+import time
+import secrets
+from pathlib import Path
+
+
+VERSION_DIR = Path(__file__).parents[2] / 'contents' / 'cache'
+
+
+class DataVersion:
+    _local: dict[str, int] = {}
+
+    @classmethod
+    def _path(cls, tag: str) -> Path:
+        return VERSION_DIR / f"{tag}.version"
+
+    @classmethod
+    def get(cls, tag: str) -> str:
+        """读取当前版本号, 文件不存在时先创建"""
+        try:
+            return cls._path(tag).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return cls.bump(tag)
+
+    @classmethod
+    def bump(cls, tag: str) -> str:
+        """生成新的版本号并原子写入"""
+        cls._local[tag] = cls._local.get(tag, 0) + 1
+        version = f"{time.time_ns()}-{os.getpid()}-{cls._local[tag]}-{secrets.token_hex(4)}"
+        VERSION_DIR.mkdir(parents=True, exist_ok=True)
+        path = cls._path(tag)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(version, encoding="utf-8")
+        os.replace(tmp, path)
+        return version
@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 """SQLAlchemy 数据库连接模块"""
-from quart import g
+import os
+import time
+import threading
+import multiprocessing
+from quart import Quart, g, jsonify, has_app_context
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
 from magic.utils.TomlConfig import GLOBAL_CONFIG, load_global_config
+from magic.utils.log3 import logger
+from magic.utils.forkSafety import registerAfterFork
+from magic.utils.metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_WAIT, DB_POOL_TIMEOUTS
+from magic.utils.db.instrument import QueryInstrument
 
-load_global_config()
-_db = GLOBAL_CONFIG.get("db", {})
 URL_TEMPLATES = {
     "sqlite": "sqlite:///{sql_sqlite_path}",
     "postgresql": "postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}",
@@ -22,41 +30,266 @@ def build_url(db_type, **cfg) -> str:
         raise ValueError(f"Unsupported DB: {db_str}")
     return URL_TEMPLATES[db_str].format(**cfg)
 
-DATABASE_URL = build_url(
-    str(_db.get("SQLNAME", "postgresql")),
-    db_user=_db.get("PGSQLUSER", "postgres"),
-    db_password=_db.get("PGSQLPWD", "postgres"),
-    db_host=_db.get("PGSQLHOST", "localhost"),
-    db_port=_db.get("PGSQLPORT", 5432),
-    db_name=_db.get("PGSQL_DB", "postgres")
-)
-engine = create_engine(
-    DATABASE_URL, 
-    pool_pre_ping=True,   # 自动检测失效连接
-    pool_recycle=3600,    # 防止数据库主动断开长连接
-    pool_size=10,         # 连接池基础大小
-    max_overflow=20       # 允许的最大溢出连接数
-)
-SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+def resolve_database_url(db_cfg: dict) -> str:
+    """环境变量 DATABASE_URL 优先, 否则由 config.toml 的 [db] 段构建"""
+    return os.getenv("DATABASE_URL") or build_url(
+        str(db_cfg.get("SQLNAME", "postgresql")),
+        db_user=db_cfg.get("PGSQLUSER", "postgres"),
+        db_password=db_cfg.get("PGSQLPWD", "postgres"),
+        db_host=db_cfg.get("PGSQLHOST", "localhost"),
+        db_port=db_cfg.get("PGSQLPORT", 5432),
+        db_name=db_cfg.get("PGSQL_DB", "postgres"),
+        sql_sqlite_path=db_cfg.get("SQLITE_PATH", "lmoadll.db")
+    )
+
+
+class TimedQueuePool(QueuePool):
+    """记录借出连接等待时间的连接池"""
+
+    def _do_get(self):
+        startedAt = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - startedAt)
+
+
+def get_worker_count() -> int:
+    """当前部署的 worker 进程数, 与 gunicorn_config.workers 保持一致"""
+    workers = os.getenv("WEB_CONCURRENCY") or GLOBAL_CONFIG.get("server", {}).get("WORKERS")
+    try:
+        return max(int(workers), 1) # pyright: ignore[reportArgumentType]
+    except (TypeError, ValueError):
+        return multiprocessing.cpu_count() * 2 + 1
+
+
+def build_pool_config(db_cfg: dict, workers: int) -> dict:
+    """
+    按全局连接预算为单个 worker 计算连接池参数
+
+    db_cfg 中可配置:
+        MAX_CONNECTIONS: 所有 worker 合计允许占用的数据库连接数, 默认 100
+        POOL_TIMEOUT: 等待空闲连接的秒数, 超时快速失败, 默认 5
+    """
+    budget = int(db_cfg.get("MAX_CONNECTIONS", 100))
+    perWorker = max(budget // max(workers, 1), 1)
+    poolSize = max(perWorker // 2, 1)
+    return {
+        "pool_size": poolSize,                    # 连接池基础大小
+        "max_overflow": perWorker - poolSize,     # 允许的最大溢出连接数
+        "pool_timeout": float(db_cfg.get("POOL_TIMEOUT", 5)),
+    }
+
+
+def _create_engine(url: str, pool_config: dict) -> Engine:
+    new_engine = create_engine(
+        url, 
+        poolclass=TimedQueuePool,
+        pool_pre_ping=True,   # 自动检测失效连接
+        pool_recycle=3600,    # 防止数据库主动断开长连接
+        **pool_config
+    )
+    QueryInstrument.attach(new_engine)
+    return new_engine
+
+
+def parse_replica_urls(value) -> list[str]:
+    """[db] REPLICA_URLS 可以是 TOML 数组, 也可以是逗号分隔的字符串"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(url).strip() for url in value if str(url).strip()]
+
+
+class ReplicaRouter:
+    """
+    只读副本路由
+
+    按轮询顺序挑选健康的副本; 副本出错后被标记为不可用,
+    冷却 retry_after 秒后先用 SELECT 1 探活再重新加入轮询.
+    没有可用副本时返回 None, 由调用方回退到主库.
+    """
+
+    def __init__(self, urls: list[str], pool_config: dict, retry_after: float = 30.0):
+        self.engines: list[Engine] = [_create_engine(url, pool_config) for url in urls]
+        self.retry_after = retry_after
+        self._downSince: dict[int, float] = {}
+        self._cursor = 0
+        self._lock = threading.Lock()
+        for index, replica in enumerate(self.engines):
+            event.listen(replica, "handle_error", self._make_error_listener(index))
+
+    def _make_error_listener(self, index: int):
+        def _on_error(context):
+            if context.is_disconnect or isinstance(context.original_exception, OSError):
+                self.mark_down(index)
+        return _on_error
+
+    def mark_down(self, index: int) -> None:
+        if index not in self._downSince:
+            logger.warning(f"只读副本 #{index} 不可用, {self.retry_after:.0f}s 后重试")
+        self._downSince[index] = time.monotonic()
+
+    def _probe(self, index: int) -> bool:
+        try:
+            with self.engines[index].connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except SQLAlchemyError:
+            self._downSince[index] = time.monotonic()
+            return False
+        self._downSince.pop(index, None)
+        logger.info(f"只读副本 #{index} 已恢复")
+        return True
+
+    def reset_after_fork(self) -> None:
+        """丢弃从父进程继承的连接和状态"""
+        self._lock = threading.Lock()
+        self._downSince.clear()
+        for replica in self.engines:
+            replica.dispose(close=False)
+
+    def pick(self) -> Engine | None:
+        """轮询选出一个健康的副本引擎"""
+        count = len(self.engines)
+        for _ in range(count):
+            with self._lock:
+                index = self._cursor % count
+                self._cursor += 1
+            downSince = self._downSince.get(index)
+            if downSince is None:
+                return self.engines[index]
+            if time.monotonic() - downSince >= self.retry_after and self._probe(index):
+                return self.engines[index]
+        return None
+
+
+SessionLocal = sessionmaker(expire_on_commit=False)
+ReadSessionLocal = sessionmaker(expire_on_commit=False)
+_engine: Engine | None = None
+_replica_router: ReplicaRouter | None = None
+_pool_config: dict = {}
+_init_lock = threading.Lock()
+
+
+def init_engine() -> Engine:
+    """
+    按配置创建主库引擎和只读副本(只执行一次)
+
+    导入本模块不会读取配置或连接数据库, 第一次使用会话或调用本函数时才创建.
+    """
+    global _engine, _replica_router, _pool_config
+    with _init_lock:
+        if _engine is not None:
+            return _engine
+        load_global_config()
+        db_cfg = GLOBAL_CONFIG.get("db", {})
+        _pool_config = build_pool_config(db_cfg, get_worker_count())
+        new_engine = _create_engine(resolve_database_url(db_cfg), _pool_config)
+        SessionLocal.configure(bind=new_engine)
+        _replica_router = ReplicaRouter(
+            parse_replica_urls(db_cfg.get("REPLICA_URLS")),
+            _pool_config,
+            float(db_cfg.get("REPLICA_RETRY_SECONDS", 30))
+        )
+        DB_POOL_CHECKED_OUT.setFunction(lambda: getattr(new_engine.pool, "checkedout", lambda: 0)())
+        DB_POOL_OVERFLOW.setFunction(lambda: max(getattr(new_engine.pool, "overflow", lambda: 0)(), 0))
+        _engine = new_engine
+        return new_engine
+
+
+def get_engine() -> Engine:
+    return _engine if _engine is not None else init_engine()
+
+
+def get_replica_router() -> ReplicaRouter:
+    get_engine()
+    return _replica_router # pyright: ignore[reportReturnType]
+
+
+def __getattr__(name: str):
+    # 兼容旧的 `from magic.utils.db.connection import engine` 写法, 访问时才创建引擎
+    if name == "engine":
+        return get_engine()
+    if name == "replica_router":
+        return get_replica_router()
+    if name == "POOL_CONFIG":
+        get_engine()
+        return _pool_config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _reset_after_fork() -> None:
+    """fork 后丢弃继承的连接池(不关闭, 父进程还在使用), 子进程按需重新建立连接"""
+    global _init_lock
+    _init_lock = threading.Lock()
+    if _engine is not None:
+        _engine.dispose(close=False)
+    if _replica_router is not None:
+        _replica_router.reset_after_fork()
+
+
+registerAfterFork("db", _reset_after_fork)
 Base = declarative_base()
 
 def init_db():
     """初始化数据库，创建所有表结构"""
     print("正在初始化数据库...")
+    init_engine()
     # Base.metadata.create_all(bind=engine)
     print("数据库初始化完成！")
 
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_primary_written(session, flush_context):
+    """本次请求写过主库后, 后续读取都留在主库, 避免读到副本的旧数据"""
+    if has_app_context():
+        g.dbWritten = True
+
 def get_db():
     """获取数据库会话"""
     if "db" not in g: 
+        get_engine()
         g.db = SessionLocal()
     return g.db
 
+def get_read_db():
+    """
+    获取只读会话
+
+    配置了 [db] REPLICA_URLS 时路由到副本; 没有副本、副本都不可用,
+    或本次请求已经写过主库时返回主库会话.
+    """
+    if g.get("dbWritten"):
+        return get_db()
+    if "readDb" not in g:
+        replica = get_replica_router().pick()
+        if replica is None:
+            return get_db()
+        g.readDb = ReadSessionLocal(bind=replica)
+    return g.readDb
+
 def close_db(e=None):
     """关闭数据库会话"""
-    db = g.pop("db", None)
-    if db: 
-        db.close()
+    for key in ("db", "readDb"):
+        db = g.pop(key, None)
+        if db: 
+            db.close()
+    g.pop("dbWritten", None)
+
+def setup_db_lifecycle(app: Quart) -> None:
+    """在应用上下文结束时归还会话, 连接池等待超时时快速返回 503"""
+
+    @app.teardown_appcontext
+    async def _teardown_db(e=None):
+        close_db(e)
+
+    @app.errorhandler(PoolTimeoutError)
+    async def _handle_pool_timeout(e: PoolTimeoutError):
+        logger.warning(f"数据库连接池等待超时({_pool_config.get('pool_timeout')}s): {e}")
+        return jsonify({"code": 503, "msg": "服务器繁忙, 请稍后再试喵"}), 503
 
 def verify_db_connection(db_type: str, **config) -> tuple[bool, str | None]:
     """验证工具：用于后台管理界面测试连接"""
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+SQL 查询埋点
+
+通过 SQLAlchemy 的 before/after_cursor_execute 事件统计每个请求的
+查询次数和数据库耗时(记录在 Quart 的 g 上), 记录慢查询,
+并在调试模式下对单个请求查询过多(疑似 N+1)发出警告.
+
+配置项([db] 段):
+    SLOW_QUERY_MS: 慢查询阈值(毫秒), 默认 200
+    MAX_QUERIES_PER_REQUEST: 单个请求的查询次数告警阈值, 默认 20
+"""
+import time
+from typing import Any
+from quart import Quart, g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from magic.utils.log3 import logger
+from magic.utils.metrics import Histogram
+from magic.utils.TomlConfig import GetConfigToml
+
+
+DB_QUERY_LATENCY = Histogram(
+    "lmoadll_db_query_duration_seconds", "SQL 语句执行耗时(秒)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+
+
+def describeParams(params: Any) -> str:
+    """只描述参数的形状(键名与类型), 不输出参数值, 避免把密码等敏感数据写进日志"""
+    if params is None:
+        return "None"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        if params and isinstance(params[0], (dict, list, tuple)):
+            return f"[{len(params)} x {describeParams(params[0])}]"
+        return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+    return type(params).__name__
+
+
+def _beforeCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    # 开始时间记在本次执行的 context 上: 语句出错时 after_cursor_execute 不会触发,
+    # context 随之丢弃, 不会在连接上残留影响后续计时
+    context._query_start = time.perf_counter()
+
+
+def _afterCursorExecute(conn, cursor, statement, parameters, context, executemany):
+    startedAt = getattr(context, "_query_start", None)
+    if startedAt is None:
+        return
+    elapsed = time.perf_counter() - startedAt
+    DB_QUERY_LATENCY.observe(elapsed)
+
+    if has_app_context():
+        g.dbQueryCount = g.get("dbQueryCount", 0) + 1
+        g.dbQueryTime = g.get("dbQueryTime", 0.0) + elapsed
+
+    if elapsed * 1000 >= QueryInstrument.slowQueryMs:
+        logger.warning(
+            f"慢查询 {elapsed * 1000:.1f}ms: {' '.join(statement.split())} | 参数: {describeParams(parameters)}"
+        )
+
+
+class QueryInstrument:
+    slowQueryMs: float = 200.0
+    maxQueriesPerRequest: int = 20
+    _engines: set = set()
+
+    @classmethod
+    def attach(cls, engine: Engine) -> None:
+        """为引擎注册埋点事件(重复调用无副作用)"""
+        if id(engine) in cls._engines:
+            return
+        event.listen(engine, "before_cursor_execute", _beforeCursorExecute)
+        event.listen(engine, "after_cursor_execute", _afterCursorExecute)
+        cls._engines.add(id(engine))
+
+    @classmethod
+    def loadConfig(cls) -> None:
+        cls.slowQueryMs = GetConfigToml("db", "SLOW_QUERY_MS", 200.0)
+        cls.maxQueriesPerRequest = GetConfigToml("db", "MAX_QUERIES_PER_REQUEST", 20)
+
+
+def setupQueryInstrumentation(app: Quart) -> None:
+    """注册请求级的查询统计钩子"""
+    QueryInstrument.loadConfig()
+
+    @app.after_request
+    async def _reportQueries(response):
+        count = g.get("dbQueryCount", 0)
+        if app.debug and count > QueryInstrument.maxQueriesPerRequest:
+            logger.warning(
+                f"{request.method} {request.path} 执行了 {count} 次查询"
+                f"(阈值 {QueryInstrument.maxQueriesPerRequest}), 耗时 {g.get('dbQueryTime', 0.0) * 1000:.1f}ms, 可能存在 N+1 查询"
+            )
+        return response
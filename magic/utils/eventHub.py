@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+进程内事件广播
+
+publish() 把事件放进每个订阅者自己的有界队列后立即返回, 不等待任何客户端;
+某个订阅者的队列满了(客户端读得太慢或已断开)就把它踢出, 由客户端自行重连,
+避免一个慢连接拖住发布方或无限占用内存. 最近的事件保存在环形缓冲里,
+重连时可以凭 Last-Event-ID 补发断开期间错过的事件.
+
+事件 id 形如 "<epoch>-<序号>", epoch 每个进程(包括 fork 出的 worker)启动时随机生成.
+Last-Event-ID 的 epoch 不是本进程的(服务重启过、或重连到了另一个 worker),
+或者错过的事件已经不在环形缓冲里, 就无法补发, 订阅者会被标记为需要全量同步(resync).
+
+事件只在本进程内广播, 多 worker 部署时每个连接只能收到所在 worker 产生的事件.
+"""
+import json
+import time
+import asyncio
+import secrets
+import itertools
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, FrozenSet, Set
+from magic.utils.metrics import Gauge, Counter
+from magic.utils.forkSafety import registerAfterFork
+
+
+EVENT_SUBSCRIBERS = Gauge(
+    "lmoadll_event_subscribers", "当前事件流订阅者数"
+)
+EVENTS_PUBLISHED = Counter(
+    "lmoadll_events_published_total", "已发布的事件数", ("topic",)
+)
+EVENT_EVICTIONS = Counter(
+    "lmoadll_event_evictions_total", "因缓冲区满被踢出的订阅者数"
+)
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    topic: str
+    data: Any
+    createdAt: float
+    epoch: str = ""
+
+    def toSse(self) -> bytes:
+        payload = json.dumps(self.data, ensure_ascii=False, default=str)
+        return f"id: {self.epoch}-{self.id}\nevent: {self.topic}\ndata: {payload}\n\n".encode("utf-8")
+
+
+@dataclass(eq=False)
+class Subscriber:
+    topics: FrozenSet[str] | None  # None 表示订阅所有主题
+    queue: asyncio.Queue
+    evicted: bool = False
+    resync: bool = False  # Last-Event-ID 无法补发, 客户端需要重新拉取全部数据
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic.split(".", 1)[0] in self.topics or topic in self.topics
+
+
+class EventHub:
+    def __init__(self, history: int = 256):
+        self._subscribers: Set[Subscriber] = set()
+        self._history: Deque[Event] = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lastId = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.epoch = secrets.token_hex(4)
+
+    def lastEventId(self) -> str:
+        """最后一个已发布事件的 id, 全量同步后客户端从这里继续"""
+        return f"{self.epoch}-{self._lastId}"
+
+    def _replayFrom(self, lastEventId: str) -> int | None:
+        """Last-Event-ID 之后的事件都还在环形缓冲里时返回其序号, 否则返回 None"""
+        epoch, _, number = lastEventId.rpartition("-")
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        position = int(number)
+        oldest = self._history[0].id if self._history else self._lastId + 1
+        if position > self._lastId or position < oldest - 1:
+            return None
+        return position
+
+    def subscribe(self, topics: FrozenSet[str] | None = None, maxBuffer: int = 100, lastEventId: str | None = None) -> Subscriber:
+        """
+        订阅事件
+
+        Parameter:
+            topics: 主题前缀集合, 如 {"user", "role"}; None 订阅所有
+            maxBuffer: 队列上限, 超出后订阅者被踢出
+            lastEventId: 重连时客户端最后收到的事件 id, 会先补发之后的历史事件; 无法补发时 subscriber.resync 为 True
+        """
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(topics, asyncio.Queue(maxsize=maxBuffer))
+        if lastEventId:
+            position = self._replayFrom(lastEventId)
+            if position is None:
+                subscriber.resync = True
+            else:
+                for event in self._history:
+                    if event.id > position and subscriber.wants(event.topic):
+                        if not self._offer(subscriber, event):
+                            return subscriber
+        self._subscribers.add(subscriber)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+
+    def publish(self, topic: str, data: Any = None) -> None:
+        """发布事件, 可以在任意线程调用, 不会阻塞"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环线程(例如 to_thread 中的批量写入), 转交给订阅者所在的循环
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self.publish, topic, data)
+            return
+        event = Event(next(self._ids), topic, data, time.time(), self.epoch)
+        self._lastId = event.id
+        self._history.append(event)
+        EVENTS_PUBLISHED.inc(topic=topic)
+        for subscriber in list(self._subscribers):
+            if subscriber.wants(topic):
+                self._offer(subscriber, event)
+
+    def _offer(self, subscriber: Subscriber, event: Event) -> bool:
+        try:
+            subscriber.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            subscriber.evicted = True
+            EVENT_EVICTIONS.inc()
+            self.unsubscribe(subscriber)
+            return False
+
+    def resetAfterFork(self) -> None:
+        self._subscribers = set()
+        self._history.clear()
+        self._ids = itertools.count(1)
+        self._lastId = 0
+        self._loop = None
+        self.epoch = secrets.token_hex(4)
+
+
+EVENT_HUB = EventHub()
+registerAfterFork("eventHub", EVENT_HUB.resetAfterFork)
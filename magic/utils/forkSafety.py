@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+fork 之后的进程状态重建
+
+gunicorn preload_app 或 start.py 多 worker 都会在父进程导入应用后 fork,
+子进程会继承数据库连接、日志文件句柄和各种进程内缓存.
+各模块通过 registerAfterFork 登记自己的重建函数, fork 后在子进程中依次执行,
+只读数据(模型、路由、静态资源)仍然以写时复制的方式共享.
+"""
+import os
+import logging
+from typing import Callable
+
+
+_hooks: list[tuple[str, Callable[[], None]]] = []
+_initializedPid = os.getpid()
+
+
+def registerAfterFork(name: str, func: Callable[[], None]) -> None:
+    """登记 fork 后需要在子进程执行的重建函数"""
+    _hooks.append((name, func))
+
+
+def reinitializeAfterFork() -> None:
+    """在子进程中执行所有重建函数, 同一进程只执行一次"""
+    global _initializedPid
+    pid = os.getpid()
+    if pid == _initializedPid:
+        return
+    _initializedPid = pid
+    for name, func in _hooks:
+        try:
+            func()
+        except Exception:
+            logging.error(f"fork 后重建 {name} 失败", exc_info=True)
+    logging.info(f"worker {pid} 已完成 fork 后初始化")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reinitializeAfterFork)
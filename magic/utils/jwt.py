@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
+"""
+访问令牌与刷新令牌
+
+刷新会话(authsession 表)和访问令牌的签名密钥(signingkey 表)保存在数据库里, 所有 worker 共享:
+任何一个 worker 签发的令牌都可以在其它 worker 上校验和刷新, 多 worker 部署不需要会话保持.
+访问令牌的黑名单仍在进程内, 撤销只在执行撤销的 worker 上立即生效,
+其它 worker 上要等访问令牌过期(默认 15 分钟), 因此访问令牌的有效期应保持较短.
+"""
 import jwt as pyjwt
+import asyncio
+import hashlib
 import secrets
 import time
 from dataclasses import dataclass, asdict
+from sqlalchemy.exc import IntegrityError
+from magic.models.authSession import AuthSession, SigningKey
+from magic.utils.db.connection import get_engine, SessionLocal
 from magic.utils.log3 import logger
-from typing import Optional, Dict, Set, List, Tuple
+from magic.utils.TomlConfig import GetConfigToml
+from typing import Optional, Dict, Set, List, Tuple, cast
 
 
 JWT_ISS = "lmoadll"
@@ -19,30 +33,104 @@ class Payload:
     create: int
     iss: str = JWT_ISS
     aud: str = JWT_AUD
+    sid: str = ""  # 所属的刷新会话, 检测到刷新令牌重放时一并撤销
+
+
+@dataclass
+class RefreshSession:
+    """
+    刷新会话
+
+    同一次登录派生出的刷新令牌属于同一个会话, 每次刷新都会换一个新的 nonce,
+    旧令牌立即失效; 会话存在但 nonce 不是当前值, 说明旧令牌被重放, 撤销整个会话.
+    """
+    sid: str
+    uid: int
+    email: str
+    nonce: str
+    expired: int          # 滑动过期时间, 每次刷新顺延
+    absoluteExpired: int  # 绝对过期时间, 到期后必须重新登录
+
+
+def accessTokenSeconds() -> int:
+    """访问令牌有效期, [auth] ACCESS_TOKEN_MINUTES, 默认 15 分钟, 过期后客户端调用 /refresh 换取新令牌"""
+    return GetConfigToml("auth", "ACCESS_TOKEN_MINUTES", 15) * 60
+
+
+def refreshTokenSeconds() -> int:
+    """刷新令牌的滑动有效期, [auth] REFRESH_TOKEN_DAYS, 默认 7 天"""
+    return GetConfigToml("auth", "REFRESH_TOKEN_DAYS", 7) * 24 * 3600
+
+
+def _hashNonce(nonce: str) -> str:
+    return hashlib.sha256(nonce.encode("utf-8")).hexdigest()
 
 
 class KeyManager:
+    """
+    签名密钥
+
+    密钥保存在 signingkey 表, 本进程用到的密钥缓存在内存里:
+    签名时只在本地最新密钥超过轮换间隔时访问数据库, 校验时只在遇到未知的 kid 时访问数据库
+    """
     _mem_keys: Dict[str, str] = {}
     _rotation_interval = 7 * 24 * 3600
 
+    @classmethod
+    def _latestSharedKey(cls, now: int) -> tuple[str, str]:
+        """取数据库中最新且未超过轮换间隔的密钥, 没有则创建; 多个 worker 同时创建时以先写入的为准"""
+        get_engine()
+        with SessionLocal() as db:
+            for _ in range(2):
+                key = db.query(SigningKey).order_by(SigningKey.createdAt.desc()).first()
+                if key is not None and now - cast(int, key.createdAt) <= cls._rotation_interval:
+                    return cast(str, key.kid), cast(str, key.secret)
+                db.add(SigningKey(kid=str(now), secret=secrets.token_urlsafe(32), createdAt=now))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()  # 同一秒内其它 worker 已经创建, 重新读取
+            raise RuntimeError("无法创建签名密钥")
+
+    @classmethod
+    def _loadSharedKey(cls, kid: str) -> Optional[str]:
+        get_engine()
+        with SessionLocal() as db:
+            key = db.get(SigningKey, kid)
+            return cast(str, key.secret) if key is not None else None
+
     @classmethod
     async def getKeyForSigning(cls) -> tuple[str, str]:
         """获取用于签名的密钥"""
         now = int(time.time())
         if not cls._mem_keys or (now - int(max(cls._mem_keys.keys()))) > cls._rotation_interval:
-            cls._mem_keys[str(now)] = secrets.token_urlsafe(32)
+            kid, secret = await asyncio.to_thread(cls._latestSharedKey, now)
+            cls._mem_keys[kid] = secret
         latestKid = max(cls._mem_keys.keys())
         return latestKid, cls._mem_keys[latestKid]
 
     @classmethod
     async def getKeyForVerifying(cls, kid: str) -> Optional[str]:
-        """根据kid获取用于验证的密钥"""
-        return cls._mem_keys.get(kid)
+        """根据kid获取用于验证的密钥, 其它 worker 创建的密钥从数据库加载"""
+        secret = cls._mem_keys.get(kid)
+        if secret is None and kid.isdigit():
+            secret = await asyncio.to_thread(cls._loadSharedKey, kid)
+            if secret is not None:
+                cls._mem_keys[kid] = secret
+        return secret
 
 
 class TokenManager:
+    """
+    令牌与刷新会话记录
+
+    刷新会话保存在 authsession 表; 访问令牌的记录和黑名单只在当前进程内,
+    会话被撤销时只能立即拉黑本进程签发的访问令牌(见模块说明)
+    """
     _userTokens: Dict[str, List[Tuple[str, int]]] = {}  # email -> list of (jid, expired_timestamp)
     _blacklist: Set[str] = set()
+    _sessionTokens: Dict[str, List[Tuple[str, int]]] = {}  # sid -> 本进程为该会话签发且尚未过期的 (jid, 过期时间)
+    _lastCleanup: int = 0
 
     @classmethod
     async def addToken(cls, email: str, jid: str, expiredTimestamp: int):
@@ -57,7 +145,7 @@ class TokenManager:
 
     @classmethod
     async def revokeTokensByUser(cls, email: str):
-        """撤销用户的所有token"""
+        """撤销用户的所有token和刷新会话"""
         jids = []
         if email in cls._userTokens:
             for jid, _ in cls._userTokens[email]:
@@ -65,6 +153,105 @@ class TokenManager:
             del cls._userTokens[email]
         for jid in jids:
             cls._blacklist.add(jid)
+        await asyncio.to_thread(cls._deleteSessions, AuthSession.email == email)
+
+    @staticmethod
+    def _deleteSessions(*criteria) -> int:
+        get_engine()
+        with SessionLocal() as db:
+            deleted = db.query(AuthSession).filter(*criteria).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+
+    @staticmethod
+    def _insertSession(session: RefreshSession, now: int) -> None:
+        get_engine()
+        with SessionLocal() as db:
+            db.add(AuthSession(
+                sid=session.sid, uid=session.uid, email=session.email, nonceHash=_hashNonce(session.nonce),
+                expired=session.expired, absoluteExpired=session.absoluteExpired, createdAt=now
+            ))
+            db.commit()
+
+    @staticmethod
+    def _rotateSession(sid: str, nonce: str, newNonce: str, now: int) -> Tuple[Optional[RefreshSession], bool]:
+        """
+        return:
+            (轮换后的会话, 是否检测到重放); 会话不存在或已过期时为 (None, False)
+        """
+        expired = now + refreshTokenSeconds()
+        get_engine()
+        with SessionLocal() as db:
+            # 条件更新: 并发使用同一个刷新令牌时只有一个请求能换到新 nonce, 其余按重放处理
+            rotated = db.query(AuthSession).filter(
+                AuthSession.sid == sid,
+                AuthSession.nonceHash == _hashNonce(nonce),
+                AuthSession.expired > now,
+                AuthSession.absoluteExpired > now
+            ).update({AuthSession.nonceHash: _hashNonce(newNonce), AuthSession.expired: expired}, synchronize_session=False)
+            row = db.get(AuthSession, sid)
+            if row is None:
+                db.commit()
+                return None, False
+            if rotated:
+                db.commit()
+                return RefreshSession(
+                    sid=sid, uid=cast(int, row.uid), email=cast(str, row.email), nonce=newNonce,
+                    expired=expired, absoluteExpired=cast(int, row.absoluteExpired)
+                ), False
+            replayed = now < min(cast(int, row.expired), cast(int, row.absoluteExpired))
+            if replayed:
+                logger.warning(f"检测到刷新令牌重放, 撤销用户 {row.uid} 的会话 {sid}")
+            db.delete(row)
+            db.commit()
+            return None, replayed
+
+    @classmethod
+    async def createRefreshSession(cls, uid: int, email: str) -> RefreshSession:
+        now = int(time.time())
+        session = RefreshSession(
+            sid=secrets.token_urlsafe(16),
+            uid=uid,
+            email=email,
+            nonce=secrets.token_urlsafe(16),
+            expired=now + refreshTokenSeconds(),
+            absoluteExpired=now + GetConfigToml("auth", "REFRESH_MAX_DAYS", 30) * 24 * 3600
+        )
+        await asyncio.to_thread(cls._insertSession, session, now)
+        return session
+
+    @classmethod
+    async def rotateRefreshSession(cls, sid: str, nonce: str) -> Optional[RefreshSession]:
+        """
+        校验并轮换刷新会话
+
+        return:
+            - 成功: 返回已更换 nonce 的会话
+            - 会话不存在、已过期或检测到重放: 返回 None
+        """
+        session, replayed = await asyncio.to_thread(
+            cls._rotateSession, sid, nonce, secrets.token_urlsafe(16), int(time.time())
+        )
+        if session is None:
+            # 会话已被删除(过期或重放), 拉黑本进程为它签发的访问令牌
+            tokens = cls._sessionTokens.pop(sid, [])
+            if replayed:
+                cls._blacklist.update(jid for jid, _ in tokens)
+        return session
+
+    @classmethod
+    async def revokeRefreshSession(cls, sid: str):
+        """撤销刷新会话以及本进程为它签发的访问令牌"""
+        await asyncio.to_thread(cls._deleteSessions, AuthSession.sid == sid)
+        cls._blacklist.update(jid for jid, _ in cls._sessionTokens.pop(sid, []))
+
+    @classmethod
+    def trackSessionToken(cls, sid: str, jid: str, expiredTimestamp: int) -> None:
+        """记录会话签发的访问令牌, 只保留尚未过期的, 会话被撤销时一并拉黑"""
+        now = int(time.time())
+        tokens = [(j, exp) for j, exp in cls._sessionTokens.get(sid, []) if exp > now]
+        tokens.append((jid, expiredTimestamp))
+        cls._sessionTokens[sid] = tokens
 
     @classmethod
     async def isRevoked(cls, jid: str) -> bool:
@@ -82,25 +269,52 @@ class TokenManager:
                 cls._userTokens[email] = new_list
             else:
                 del cls._userTokens[email]
+        for sid in list(cls._sessionTokens.keys()):
+            tokens = [(jid, exp) for jid, exp in cls._sessionTokens[sid] if exp > now]
+            if tokens:
+                cls._sessionTokens[sid] = tokens
+            else:
+                del cls._sessionTokens[sid]
+        cls._lastCleanup = now
+        await asyncio.to_thread(
+            cls._deleteSessions, (AuthSession.expired <= now) | (AuthSession.absoluteExpired <= now)
+        )
 
 
-async def generateToken(uid: int, email: str, expireDays: int = 7) -> str:
+async def generateToken(uid: int, email: str, expireSeconds: int = 7 * 24 * 3600, sid: str = "") -> str:
     """签发令牌"""
     kid, secret = await KeyManager.getKeyForSigning()
     now = int(time.time())
-    expiredTimestamp = now + expireDays * 24 * 3600
+    expiredTimestamp = now + expireSeconds
     jid = secrets.token_urlsafe(16)
     payload = Payload(
         jid=jid,
         uid=uid,
         email=email,
         expired=expiredTimestamp,
-        create=now
+        create=now,
+        sid=sid
     )
     payloadDict = asdict(payload)
     await TokenManager.addToken(email, jid, expiredTimestamp)
+    if sid:
+        TokenManager.trackSessionToken(sid, jid, expiredTimestamp)
     return pyjwt.encode(payloadDict, secret, algorithm="HS256", headers={"kid": kid})
 
+
+def encodeRefreshToken(session: RefreshSession) -> str:
+    return f"{session.sid}.{session.nonce}"
+
+
+def decodeRefreshToken(token: str | None) -> Optional[Tuple[str, str]]:
+    """只检查格式, 格式不对的令牌不会触及会话表"""
+    if not token or len(token) > 64 or token.count(".") != 1:
+        return None
+    sid, nonce = token.split(".")
+    if not sid or not nonce:
+        return None
+    return sid, nonce
+
 async def verifyJwtPayload(token: str | None) -> Optional[Payload]:
     """验证并解析令牌"""
     try:
@@ -119,6 +333,8 @@ async def verifyJwtPayload(token: str | None) -> Optional[Payload]:
         jid = data.get("jid")
         if jid is None:
             return None
+        if int(data.get("expired", 0)) <= int(time.time()):
+            return None
         if await TokenManager.isRevoked(jid):
             logger.warning("Token is revoked")
             return None
@@ -134,6 +350,38 @@ async def generateLoginToken(uid: int, email: str) -> str:
     """生成登录令牌"""
     return await generateToken(uid, email)
 
+async def issueLoginTokens(uid: int, email: str) -> Tuple[str, str]:
+    """
+    登录成功后签发短期访问令牌和刷新令牌
+
+    return:
+        (accessToken, refreshToken)
+    """
+    if int(time.time()) - TokenManager._lastCleanup > 600:
+        await TokenManager.cleanupExpiredTokens()
+    session = await TokenManager.createRefreshSession(uid, email)
+    accessToken = await generateToken(uid, email, accessTokenSeconds(), session.sid)
+    return accessToken, encodeRefreshToken(session)
+
+async def refreshLoginTokens(refreshToken: str | None) -> Optional[Tuple[str, str]]:
+    """
+    用刷新令牌换取新的访问令牌和刷新令牌(旧刷新令牌随即失效)
+
+    不计算密码哈希, 只对会话表做一次条件更新(按主键), 任何 worker 都可以处理.
+
+    return:
+        - 成功: (accessToken, refreshToken)
+        - 失败: None, 需要重新登录
+    """
+    decoded = decodeRefreshToken(refreshToken)
+    if decoded is None:
+        return None
+    session = await TokenManager.rotateRefreshSession(*decoded)
+    if session is None:
+        return None
+    accessToken = await generateToken(session.uid, session.email, accessTokenSeconds(), session.sid)
+    return accessToken, encodeRefreshToken(session)
+
 async def revokeUserTokens(email: str):
     """撤销用户的所有token"""
     await TokenManager.revokeTokensByUser(email)
@@ -6,6 +6,7 @@ import zipfile
 import datetime
 from pathlib import Path
 import colorlog
+from magic.utils.forkSafety import registerAfterFork
 
 # --- 配置与常量 ---
 LOG_DIR = Path(__file__).parents[2] / 'contents' / 'logs'
@@ -40,6 +41,17 @@ class LogManager:
                     f.unlink()
             print(f"Archived {len(files)} logs to {zip_path.name}")
 
+    @staticmethod
+    def reopen_handlers():
+        """fork 后重新打开文件句柄, 不再和父进程共用同一个文件描述符"""
+        for hdl in logging.getLogger().handlers:
+            if isinstance(hdl, logging.FileHandler):
+                with hdl.lock: # pyright: ignore[reportOptionalContextManager]
+                    old_stream = hdl.stream
+                    hdl.stream = hdl._open()
+                    if old_stream:
+                        old_stream.close()
+
     @staticmethod
     def get_current_path() -> Path:
         """获取今日最新的日志路径"""
@@ -55,12 +67,12 @@ class LogManager:
         return LOG_DIR / f"{today}-{new_count}.log"
 
 def init_logger():
-    LogManager.setup_dir()
-    log_path = LogManager.get_current_path()
-    
     logger = colorlog.getLogger()
     if logger.handlers: 
         return logger # 避免重复初始化
+
+    LogManager.setup_dir()
+    log_path = LogManager.get_current_path()
     
     logger.setLevel(logging.DEBUG)
 
@@ -81,5 +93,6 @@ def init_logger():
     logger.info(f"Log initialized: {log_path.name}")
     return logger
 
-# 全局实例
-logger = init_logger()
+# 全局实例(根 logger), 处理器和日志文件在 init_logger() 中创建, 导入本模块没有副作用
+logger = colorlog.getLogger()
+registerAfterFork("log3", LogManager.reopen_handlers)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+日志检索
+
+按时间范围、级别和子串查询 contents/logs 下的当天日志(*.log)和归档(*-logs.zip).
+
+- 当天日志用 mmap 读取, 不整体载入内存;
+- 归档中的成员逐行流式解压, 不把整个压缩包解压到内存;
+- 每个文件维护一份稀疏的 时间 -> 偏移 索引(约每 INDEX_STEP 字节一个点),
+  带开始时间的查询先二分定位到对应区域再往后扫描, 超过结束时间即停止.
+  当天日志的索引在内存中随文件增长增量补全; 归档不会再变化,
+  首次查询时建立索引并保存到 contents/cache/logindex/, 时间范围外的成员直接跳过.
+
+日志行格式见 log3.init_logger: "[YYYY-mm-dd HH:MM:SS LVL]: message",
+没有该前缀的行(如异常堆栈)属于上一条记录. 时间戳是本地时间字符串, 直接按字典序比较.
+"""
+import re
+import json
+import mmap
+import bisect
+import zipfile
+import datetime
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple
+from magic.utils.log3 import LOG_DIR, LEVEL_MAP
+
+
+INDEX_STEP = 64 * 1024
+INDEX_DIR = Path(__file__).parents[2] / 'contents' / 'cache' / 'logindex'
+RECORD_PREFIX = re.compile(rb"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) ([A-Z]+)\]: ")
+LEVEL_ALIASES = {**LEVEL_MAP, **{v: v for v in LEVEL_MAP.values()}}  # 文件中可能是全称也可能是缩写
+ARCHIVE_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})-logs\.zip$")
+LIVE_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})-\d+\.log$")
+
+Points = List[Tuple[str, int]]  # [(时间戳, 记录起始偏移)]
+
+
+@dataclass
+class LogQuery:
+    start: Optional[str] = None       # "YYYY-mm-dd HH:MM:SS", 含
+    end: Optional[str] = None         # 同上, 含
+    levels: Optional[Set[str]] = None  # 缩写形式, 如 {"ERR", "WRN"}
+    contains: Optional[bytes] = None
+    ignoreCase: bool = False
+
+    def dayInRange(self, day: str) -> bool:
+        return not ((self.start and day < self.start[:10]) or (self.end and day > self.end[:10]))
+
+
+def normalizeLevel(level: str) -> str | None:
+    return LEVEL_ALIASES.get(level.strip().upper())
+
+
+def parseTime(value: str | None) -> str | None:
+    """接受 epoch 秒或 ISO 时间, 转为日志中的本地时间字符串"""
+    if not value:
+        return None
+    try:
+        moment = datetime.datetime.fromtimestamp(float(value))
+    except (ValueError, OverflowError, OSError):
+        # 不是数字, 或者是 inf / 超出平台范围的 epoch; 后者按 ISO 解析同样失败, 抛出 ValueError
+        moment = datetime.datetime.fromisoformat(value.replace("T", " "))
+        if moment.tzinfo is not None:
+            moment = moment.astimezone().replace(tzinfo=None)
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _seekOffset(points: Points, start: str | None) -> int:
+    """索引中最后一个时间早于 start 的点(保守地多扫描一段, 不会漏记录)"""
+    if not start or not points:
+        return 0
+    index = bisect.bisect_left([ts for ts, _ in points], start)
+    return points[index - 1][1] if index > 0 else 0
+
+
+def _records(lines: Iterator[Tuple[int, bytes]]) -> Iterator[Tuple[str, str, bytes]]:
+    """把 (偏移, 行) 流合并为 (时间戳, 级别, 记录) 流, 跳过开头不完整的记录"""
+    current: Optional[List] = None
+    for _, line in lines:
+        match = RECORD_PREFIX.match(line)
+        if match:
+            if current is not None:
+                yield current[0], current[1], b"".join(current[2])
+            current = [match.group(1).decode(), match.group(2).decode(), [line]]
+        elif current is not None:
+            current[2].append(line)
+    if current is not None:
+        yield current[0], current[1], b"".join(current[2])
+
+
+def _filter(records: Iterator[Tuple[str, str, bytes]], query: LogQuery, source: str) -> Iterator[dict]:
+    needle = query.contains.lower() if query.contains and query.ignoreCase else query.contains
+    for ts, level, record in records:
+        if query.end and ts > query.end:
+            return
+        if query.start and ts < query.start:
+            continue
+        if query.levels and level not in query.levels:
+            continue
+        if needle and needle not in (record.lower() if query.ignoreCase else record):
+            continue
+        text = record.decode("utf-8", "replace").rstrip("\r\n")
+        yield {"time": ts, "level": level, "message": text[text.find("]: ") + 3:], "source": source}
+
+
+# --- 当天日志(mmap) ---
+class _LiveIndex:
+    """单个日志文件的增量索引, 只在文件增长时补全新增部分"""
+
+    def __init__(self):
+        self.points: Points = []
+        self.indexedTo = 0
+
+
+_liveIndexes: Dict[Path, _LiveIndex] = {}
+_liveLock = threading.Lock()
+
+
+def _extendLiveIndex(path: Path, mm: mmap.mmap) -> Points:
+    with _liveLock:
+        index = _liveIndexes.setdefault(path, _LiveIndex())
+        pos = index.indexedTo  # 下一个索引点从这里之后的第一条记录开始
+        size = len(mm)
+        while pos < size:
+            if pos == 0:
+                start = 0
+            else:
+                newline = mm.find(b"\n[", pos - 1)
+                if newline < 0:
+                    break
+                start = newline + 1
+            match = RECORD_PREFIX.match(mm, start)
+            if match:
+                index.points.append((match.group(1).decode(), start))
+            pos = start + INDEX_STEP
+        index.indexedTo = pos
+        return list(index.points)
+
+
+def _mmapLines(mm: mmap.mmap, offset: int) -> Iterator[Tuple[int, bytes]]:
+    size = len(mm)
+    while offset < size:
+        end = mm.find(b"\n", offset)
+        end = size if end < 0 else end + 1
+        yield offset, mm[offset:end]
+        offset = end
+
+
+def _searchLive(path: Path, query: LogQuery) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # 空文件
+        with mm:
+            offset = _seekOffset(_extendLiveIndex(path, mm), query.start)
+            yield from _filter(_records(_mmapLines(mm, offset)), query, path.name)
+
+
+# --- 归档(zip 流式解压) ---
+def _memberLines(member: IO[bytes], offset: int) -> Iterator[Tuple[int, bytes]]:
+    for line in member:
+        yield offset, line
+        offset += len(line)
+
+
+def _buildArchiveIndex(path: Path) -> dict:
+    """流式读取归档的每个成员, 记录首尾时间和稀疏索引点"""
+    result = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            points: Points = []
+            first = last = None
+            nextPoint = 0
+            with archive.open(info) as member:
+                for offset, line in _memberLines(member, 0):
+                    match = RECORD_PREFIX.match(line)
+                    if not match:
+                        continue
+                    ts = match.group(1).decode()
+                    first = first or ts
+                    last = ts
+                    if offset >= nextPoint:
+                        points.append((ts, offset))
+                        nextPoint = offset + INDEX_STEP
+            result[info.filename] = {"first": first, "last": last, "points": points}
+    return result
+
+
+def _archiveIndex(path: Path) -> dict:
+    stat = path.stat()
+    indexPath = INDEX_DIR / f"{path.name}.json"
+    try:
+        cached = json.loads(indexPath.read_text(encoding="utf-8"))
+        if cached.get("size") == stat.st_size and cached.get("mtime") == stat.st_mtime:
+            return cached["members"]
+    except (OSError, ValueError):
+        pass
+    members = _buildArchiveIndex(path)
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = indexPath.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"size": stat.st_size, "mtime": stat.st_mtime, "members": members}), encoding="utf-8")
+    tmp.replace(indexPath)
+    return members
+
+
+def _searchArchive(path: Path, query: LogQuery) -> Iterator[dict]:
+    members = _archiveIndex(path)
+    with zipfile.ZipFile(path) as archive:
+        for name, meta in members.items():
+            if meta["first"] is None:
+                continue
+            if (query.start and meta["last"] < query.start) or (query.end and meta["first"] > query.end):
+                continue
+            offset = _seekOffset([tuple(p) for p in meta["points"]], query.start) # pyright: ignore[reportArgumentType]
+            with archive.open(name) as member:
+                member.seek(offset)  # 向前解压并丢弃, 内存占用与文件大小无关
+                yield from _filter(_records(_memberLines(member, offset)), query, f"{path.name}/{name}")
+
+
+# --- 入口 ---
+def logSources(query: LogQuery) -> List[Tuple[str, Path]]:
+    """按日期排序的候选文件, 日期不在查询范围内的直接跳过"""
+    sources = []
+    for path in LOG_DIR.glob("*"):
+        match = ARCHIVE_NAME.match(path.name) or LIVE_NAME.match(path.name)
+        if match and query.dayInRange(match.group(1)):
+            sources.append((match.group(1), path))
+    return sorted(sources, key=lambda item: (item[0], item[1].suffix != ".zip", item[1].name))
+
+
+def searchLogs(query: LogQuery, limit: int = 1000) -> Iterator[dict]:
+    """按时间顺序逐条产出匹配的记录, 最多 limit 条"""
+    if limit <= 0:
+        return
+    count = 0
+    for _, path in logSources(query):
+        search = _searchArchive if path.suffix == ".zip" else _searchLive
+        for record in search(path, query):
+            yield record
+            count += 1
+            if count >= limit:
+                return
@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+#lmoadll_bl platform
+#
+#@copyright  Copyright (c) 2025 lmoadll_bl team
+#@license  GNU General Public License 3.0
+"""
+进程内指标注册表
+
+提供 Counter / Gauge / Histogram 三种指标, 以 Prometheus 文本格式导出.
+多进程部署(gunicorn 多 worker)时, 设置环境变量 PROMETHEUS_MULTIPROC_DIR,
+每个 worker 每隔 SNAPSHOT_INTERVAL 秒把自己的快照写入该目录, 导出时合并所有 worker 的数据.
+快照目录的生命周期由主进程管理(与 prometheus_client 的多进程模式相同):
+    - 启动 worker 之前调用 clearSnapshots, 丢弃上次运行留下的快照;
+    - worker 退出后调用 markProcessDead(pid), 把它的 Counter / Histogram 累加进
+      metrics-dead.json 并删除它的快照, 计数不会因为 worker 重启而回退, pid 被复用时也不会互相覆盖;
+      已退出进程的 Gauge 直接丢弃.
+"""
+import os
+import json
+import math
+import time
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from quart import Quart
+from magic.utils.forkSafety import registerAfterFork
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl, 也没有需要 markProcessDead 的多进程启动方式
+    fcntl = None
+
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "REGISTRY",
+    "renderMetrics",
+    "dumpSnapshot",
+    "maybeDumpSnapshot",
+    "clearSnapshots",
+    "markProcessDead",
+    "setupMetricsSnapshots",
+    "CONTENT_TYPE_LATEST",
+]
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+SNAPSHOT_INTERVAL = 1.0
+DEAD_SNAPSHOT = "metrics-dead.json"
+
+LabelKey = Tuple[str, ...]
+
+
+def _formatValue(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escapeLabel(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatLabels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escapeLabel(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escapeLabel(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    """指标基类"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}, 实际为 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def snapshot(self) -> Dict[str, list]:
+        """返回可 JSON 序列化的当前值"""
+
+    def reset(self) -> None:
+        """清空数值(fork 后使用, 避免重复计入父进程的数据)"""
+        self._lock = threading.Lock()
+        values = getattr(self, "_values")
+        values.clear()
+        if not self.labelnames and self.kind != "histogram":
+            values[()] = 0.0
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        self._values: Dict[LabelKey, float] = {}
+        super().__init__(*args, **kwargs)
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counter 只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {"values": [[list(k), v] for k, v in self._values.items()]}
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值, 也可以绑定一个采集时调用的函数"""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        self._values: Dict[LabelKey, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+        super().__init__(*args, **kwargs)
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def setFunction(self, func: Callable[[], float]) -> None:
+        """绑定采集函数(仅支持无标签的 Gauge)"""
+        if self.labelnames:
+            raise ValueError("带标签的 Gauge 不支持 setFunction")
+        self._function = func
+
+    def snapshot(self) -> Dict[str, list]:
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+        with self._lock:
+            return {"values": [[list(k), v] for k, v in self._values.items()]}
+
+
+class Histogram(_Metric):
+    """固定分桶直方图"""
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        buckets = tuple(sorted(buckets))
+        if buckets[-1] != math.inf:
+            buckets = buckets + (math.inf,)
+        self.buckets = buckets
+        self._values: Dict[LabelKey, List[float]] = {}  # labels -> [每个桶的计数..., sum, count]
+        super().__init__(*args, **kwargs)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {
+                "buckets": [_formatValue(b) for b in self.buckets],
+                "values": [[list(k), list(v)] for k, v in self._values.items()],
+            }
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lastDump = 0.0
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+        self._lastDump = 0.0
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {
+            name: {"kind": m.kind, "doc": m.documentation, "labels": list(m.labelnames), **m.snapshot()}
+            for name, m in self._metrics.items()
+        }
+
+
+REGISTRY = Registry()
+registerAfterFork("metrics", REGISTRY.reset)
+
+
+def _pidAlive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshotPath(pid: int) -> str:
+    return os.path.join(MULTIPROC_DIR, f"metrics-{pid}.json")
+
+
+def _writeJson(path: str, data: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _readJson(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+
+@contextmanager
+def _directoryLock(exclusive: bool) -> Iterator[None]:
+    """合并已退出进程(写)与导出(读)互斥, 导出时不会看到累加了一半的数据"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(MULTIPROC_DIR, ".lock"), "a") as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+def dumpSnapshot(registry: Registry = REGISTRY) -> None:
+    """把当前进程的快照写入多进程目录"""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    _writeJson(_snapshotPath(os.getpid()), registry.snapshot())
+    registry._lastDump = time.monotonic()
+
+
+def maybeDumpSnapshot(registry: Registry = REGISTRY) -> None:
+    """节流写入快照, 供请求钩子调用"""
+    if MULTIPROC_DIR and time.monotonic() - registry._lastDump >= SNAPSHOT_INTERVAL:
+        dumpSnapshot(registry)
+
+
+def clearSnapshots() -> None:
+    """主进程启动 worker 之前调用: 删除上次运行留下的快照和已退出进程的累计值"""
+    if not MULTIPROC_DIR or not os.path.isdir(MULTIPROC_DIR):
+        return
+    for fname in os.listdir(MULTIPROC_DIR):
+        if fname.startswith("metrics-") and (fname.endswith(".json") or fname.endswith(".tmp")):
+            try:
+                os.remove(os.path.join(MULTIPROC_DIR, fname))
+            except FileNotFoundError:
+                pass
+
+
+def markProcessDead(pid: int) -> None:
+    """主进程在 worker 退出后调用: 把它的 Counter / Histogram 累加进 metrics-dead.json, 删除它的快照"""
+    if not MULTIPROC_DIR or not os.path.isdir(MULTIPROC_DIR):
+        return
+    path = _snapshotPath(pid)
+    with _directoryLock(exclusive=True):
+        snap = _readJson(path)
+        if snap is not None:
+            deadPath = os.path.join(MULTIPROC_DIR, DEAD_SNAPSHOT)
+            merged = _merge([(None, _readJson(deadPath) or {}), (None, snap)])
+            _writeJson(deadPath, {
+                name: {**data, "values": [[list(key), value] for key, value in data["values"].items()]}
+                for name, data in merged.items()
+            })
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def setupMetricsSnapshots(app: Quart) -> None:
+    """在 Init_module(before_serving) 中调用: 多进程模式下定期写快照, 没有请求的 worker 也能导出, 停止前写出最后一次"""
+    if not MULTIPROC_DIR:
+        return
+    dumpSnapshot()
+
+    async def _run() -> None:
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            maybeDumpSnapshot()
+
+    task = asyncio.create_task(_run())
+
+    @app.after_serving
+    async def _dumpFinalSnapshot():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        dumpSnapshot()
+
+
+def _loadSnapshots(registry: Registry) -> List[Tuple[Optional[int], Dict[str, dict]]]:
+    """
+    读取所有 worker 的快照和已退出进程的累计值(pid 为 None),
+    多进程模式未开启时只返回本进程数据
+    """
+    if not MULTIPROC_DIR:
+        return [(os.getpid(), registry.snapshot())]
+    dumpSnapshot(registry)
+    result: List[Tuple[Optional[int], Dict[str, dict]]] = []
+    with _directoryLock(exclusive=False):
+        for fname in os.listdir(MULTIPROC_DIR):
+            if not (fname.startswith("metrics-") and fname.endswith(".json")):
+                continue
+            if fname == DEAD_SNAPSHOT:
+                pid = None
+            else:
+                try:
+                    pid = int(fname[len("metrics-"):-len(".json")])
+                except ValueError:
+                    continue
+            snap = _readJson(os.path.join(MULTIPROC_DIR, fname))
+            if snap is not None:
+                result.append((pid, snap))
+    return result
+
+
+def _merge(snapshots: List[Tuple[Optional[int], Dict[str, dict]]]) -> Dict[str, dict]:
+    """合并多进程快照: Counter/Histogram 累加, Gauge 只累加存活进程(pid 为 None 的累计值不含 Gauge)"""
+    merged: Dict[str, dict] = {}
+    for pid, snap in snapshots:
+        alive = pid is not None and _pidAlive(pid)
+        for name, data in snap.items():
+            if data["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**data, "values": {}})
+            values = target["values"]
+            for labelValues, value in data["values"]:
+                key = tuple(labelValues)
+                if data["kind"] == "histogram":
+                    row = values.get(key)
+                    values[key] = list(value) if row is None else [a + b for a, b in zip(row, value)]
+                else:
+                    values[key] = values.get(key, 0.0) + value
+    return merged
+
+
+def renderMetrics(registry: Registry = REGISTRY) -> str:
+    """以 Prometheus 文本格式导出(多进程模式下为所有 worker 的聚合)"""
+    lines: List[str] = []
+    for name, data in sorted(_merge(_loadSnapshots(registry)).items()):
+        labelnames = tuple(data["labels"])
+        lines.append(f"# HELP {name} {data['doc']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        for key, value in sorted(data["values"].items()):
+            if data["kind"] == "histogram":
+                cumulative = 0.0
+                for bound, count in zip(data["buckets"], value[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_formatLabels(labelnames, key, ('le', bound))} {_formatValue(cumulative)}")
+                lines.append(f"{name}_sum{_formatLabels(labelnames, key)} {_formatValue(value[-2])}")
+                lines.append(f"{name}_count{_formatLabels(labelnames, key)} {_formatValue(value[-1])}")
+            else:
+                lines.append(f"{name}{_formatLabels(labelnames, key)} {_formatValue(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- 应用级指标 ---
+HTTP_REQUESTS = Counter(
+    "lmoadll_http_requests_total", "HTTP 请求总数", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "lmoadll_http_request_duration_seconds", "HTTP 请求耗时(秒)", ("method", "route")
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "lmoadll_db_pool_checked_out", "连接池中已借出的连接数"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "lmoadll_db_pool_overflow", "连接池当前溢出连接数"
+)
+DB_POOL_WAIT = Histogram(
+    "lmoadll_db_pool_wait_seconds", "从连接池借出连接的等待时间(秒)",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0)
+)
+DB_POOL_TIMEOUTS = Counter(
+    "lmoadll_db_pool_timeouts_total", "等待连接池超时的次数"
+)
+ARGON2_INFLIGHT = Gauge(
+    "lmoadll_argon2_inflight", "正在进行的 Argon2 哈希/验证数"
+)
+ARGON2_REHASHES = Counter(
+    "lmoadll_argon2_rehashes_total", "登录时升级 Argon2 参数的次数", ("result",)
+)
+MAIL_QUEUE_DEPTH = Gauge(
+    "lmoadll_mail_queue_depth", "等待发送或正在发送的邮件数"
+)
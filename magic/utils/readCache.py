@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+进程内读缓存(LRU + TTL, 按标签失效)
+
+写操作通过 invalidate(tag) 精确失效本进程的条目, TTL 兜底限制最长陈旧时间.
+跨 worker 失效复用 DataVersion: 每隔 CHECK_INTERVAL 秒读取一次版本号文件,
+其它 worker 写入过数据就清空本进程缓存. 一般缓存由 [cache] CROSS_WORKER 决定是否开启;
+USER_CACHE 的快照带有角色, 鉴权依赖它, 所以总是开启.
+
+配置项([cache] 段):
+    <NAME>_MAXSIZE: 最大条目数, 默认 10000
+    <NAME>_TTL: 条目存活秒数, 默认 60
+    CROSS_WORKER: 未指定 crossWorker 的缓存是否开启跨 worker 失效, 默认 false
+    CHECK_INTERVAL: 跨 worker 版本检查间隔(秒), 默认 1
+"""
+import time
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Set, Tuple
+from cachetools import TTLCache
+from magic.utils.TomlConfig import GetConfigToml
+from magic.utils.dataVersion import DataVersion
+from magic.utils.forkSafety import registerAfterFork
+from magic.utils.metrics import Counter
+
+
+CACHE_REQUESTS = Counter(
+    "lmoadll_cache_requests_total", "读缓存查询次数", ("cache", "result")
+)
+CACHE_INVALIDATIONS = Counter(
+    "lmoadll_cache_invalidations_total", "读缓存失效的条目数", ("cache",)
+)
+
+_MISSING = object()
+
+
+class ReadCache:
+    """
+    带标签索引的 TTLCache
+
+    Parameter:
+        name: 缓存名, 用于指标标签和配置项前缀
+        versionTag: 可选, 跨 worker 失效时比对的 DataVersion 标签
+        crossWorker: 是否开启跨 worker 失效, None 表示按 [cache] CROSS_WORKER 配置
+
+    示例:
+        ```
+        user = USER_CACHE.getOrLoad(("uid", uid), lambda: loadUser(uid), lambda u: [f"user:{uid}"])
+        USER_CACHE.invalidate(f"user:{uid}")
+        ```
+    """
+
+    def __init__(self, name: str, versionTag: str | None = None, crossWorker: bool | None = None):
+        self.name = name
+        self.versionTag = versionTag
+        self.crossWorker = crossWorker
+        self._store: TTLCache | None = None
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self._crossWorker = False
+        self._checkInterval = 1.0
+        self._checkedAt = 0.0
+        self._version: str | None = None
+
+    def _cache(self) -> TTLCache:
+        # 第一次使用时才读取配置, 导入模块没有副作用
+        if self._store is None:
+            prefix = self.name.upper()
+            self._store = TTLCache(maxsize=GetConfigToml("cache", f"{prefix}_MAXSIZE", 10000), ttl=GetConfigToml("cache", f"{prefix}_TTL", 60.0))
+            crossWorker = GetConfigToml("cache", "CROSS_WORKER", False) if self.crossWorker is None else self.crossWorker
+            self._crossWorker = bool(self.versionTag) and crossWorker
+            self._checkInterval = GetConfigToml("cache", "CHECK_INTERVAL", 1.0)
+        return self._store
+
+    def _syncVersion(self) -> None:
+        """其它 worker 写入过数据时清空本进程缓存"""
+        now = time.monotonic()
+        if now - self._checkedAt < self._checkInterval:
+            return
+        self._checkedAt = now
+        version = DataVersion.get(self.versionTag) # pyright: ignore[reportArgumentType]
+        if version != self._version:
+            if self._version is not None:
+                self.clear()
+            self._version = version
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """return: (是否命中, 值), 缓存的 None 也算命中"""
+        cache = self._cache()
+        if self._crossWorker:
+            self._syncVersion()
+        with self._lock:
+            value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            return False, None
+        CACHE_REQUESTS.inc(cache=self.name, result="hit")
+        return True, value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        cache = self._cache()
+        with self._lock:
+            cache[key] = value
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            if len(self._tags) > 2 * cache.maxsize:
+                self._pruneTags(cache)
+
+    def getOrLoad(self, key: Hashable, loader: Callable[[], Any], tagsOf: Callable[[Any], Iterable[str]]) -> Any:
+        """命中时直接返回, 否则调用 loader 加载并按 tagsOf(value) 登记标签"""
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = loader()
+        self.set(key, value, tagsOf(value))
+        return value
+
+    def invalidate(self, *tags: str) -> None:
+        """删除带有任一标签的条目"""
+        cache = self._cache()
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if cache.pop(key, _MISSING) is not _MISSING:
+                        removed += 1
+        if removed:
+            CACHE_INVALIDATIONS.inc(removed, cache=self.name)
+
+    def clear(self) -> None:
+        with self._lock:
+            removed = len(self._store) if self._store is not None else 0
+            if self._store is not None:
+                self._store.clear()
+            self._tags.clear()
+        if removed:
+            CACHE_INVALIDATIONS.inc(removed, cache=self.name)
+
+    def _pruneTags(self, cache: TTLCache) -> None:
+        """标签索引中去掉已因 TTL/LRU 淘汰的键"""
+        for tag in list(self._tags):
+            alive = {key for key in self._tags[tag] if key in cache}
+            if alive:
+                self._tags[tag] = alive
+            else:
+                del self._tags[tag]
+
+    def resetAfterFork(self) -> None:
+        self._lock = threading.Lock()
+        self.clear()
+        self._checkedAt = 0.0
+
+
+# --- 应用级缓存 ---
+USER_CACHE = ReadCache("users", versionTag="users", crossWorker=True)
+"""用户查询缓存(从主库加载), 键为 ("uid", uid) / ("nameExactly", name), 标签为 user:<uid> / email:<email> / name:<name>"""
+
+registerAfterFork("readCache", USER_CACHE.resetAfterFork)
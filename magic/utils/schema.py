@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+声明式请求体校验
+
+在模块导入时定义 Schema(正则只编译一次), 请求进来时一次遍历完成
+必填、类型、长度和格式检查, 在查库或计算 Argon2 之前拒绝非法输入.
+
+示例:
+    ```
+    LOGIN_SCHEMA = Schema(
+        email=Field(pattern=EMAIL_PATTERN, message="邮箱格式不正确喵"),
+        password=Field(pattern=PASSWORD_PATTERN, message="密码格式不正确喵"),
+    )
+    data = LOGIN_SCHEMA.validate(await request.get_json(silent=True))
+    ```
+"""
+import re
+from dataclasses import dataclass
+from typing import Any
+from magic.middleware.response import APIException
+
+
+@dataclass(frozen=True)
+class Field:
+    """单个字段的校验规则"""
+    pattern: re.Pattern | None = None
+    kind: type = str
+    required: bool = True
+    minLen: int | None = None
+    maxLen: int | None = None
+    message: str = "参数格式不正确喵"
+
+    def __post_init__(self):
+        # 长度和正则只对字符串有意义, 在定义 Schema 时就拒绝错误的组合
+        if self.kind is not str and (self.pattern is not None or self.minLen is not None or self.maxLen is not None):
+            raise ValueError(f"pattern / minLen / maxLen 只能用于 str 字段, 当前为 {self.kind.__name__}")
+
+    def check(self, value: Any) -> bool:
+        if self.kind is int:
+            # bool 是 int 的子类, 这里不接受
+            if isinstance(value, bool) or not isinstance(value, int):
+                return False
+            return True
+        if not isinstance(value, self.kind):
+            return False
+        if not isinstance(value, str):
+            return True
+        if self.minLen is not None and len(value) < self.minLen:
+            return False
+        if self.maxLen is not None and len(value) > self.maxLen:
+            return False
+        if self.pattern is not None and self.pattern.match(value) is None:
+            return False
+        return True
+
+
+class Schema:
+    """请求体校验规则集合"""
+
+    def __init__(self, **fields: Field):
+        self.fields = tuple(fields.items())
+
+    def check(self, data: Any) -> tuple[dict | None, str | None]:
+        """
+        校验请求体
+
+        return:
+            (只包含声明字段的字典, None) 或 (None, 第一个错误的提示信息)
+        """
+        if not isinstance(data, dict):
+            return None, "请求体必须是 JSON 对象喵"
+        cleaned = {}
+        for name, field in self.fields:
+            value = data.get(name)
+            if value is None:
+                if field.required:
+                    return None, field.message
+                continue
+            if not field.check(value):
+                return None, field.message
+            cleaned[name] = value
+        return cleaned, None
+
+    def validate(self, data: Any) -> dict:
+        """校验请求体, 失败时抛出 APIException"""
+        cleaned, error = self.check(data)
+        if cleaned is None:
+            raise APIException(error or "参数格式不正确喵", code=233)
+        return cleaned
+
+    def validateMany(self, items: Any) -> tuple[list[dict], list[dict]]:
+        """
+        批量校验, 供批量接口使用
+
+        return:
+            (通过校验的条目列表, [{"index": 下标, "msg": 错误信息}, ...])
+        """
+        if not isinstance(items, list):
+            raise APIException("请求体必须是 JSON 数组喵", code=233)
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            cleaned, error = self.check(item)
+            if cleaned is None:
+                errors.append({"index": index, "msg": error})
+            else:
+                valid.append(cleaned)
+        return valid, errors
@@ -71,3 +71,53 @@ create table lmoadll_options
 
 create unique index lmoadll_options__name_user
     on lmoadll_options (name, user);
+
+
+-- 审计日志表(只追加), 对应 magic.models.auditLog.AuditLog
+create table auditlog
+(
+    id         integer     not null
+        constraint auditlog_pk
+            primary key autoincrement,
+    createdAt  int(10)     default 0 not null,
+    actorId    integer     default 0,
+    actorIp    varchar(64) default '',
+    action     varchar(32) not null,
+    targetType varchar(32) default '',
+    targetId   varchar(64) default '',
+    detail     text        default ''
+);
+
+-- auditlog表索引
+create index ixAuditLogCreatedAt on auditlog (createdAt);
+create index ixAuditLogTarget on auditlog (targetType, targetId);
+
+
+-- 刷新会话表, 对应 magic.models.authSession.AuthSession
+create table authsession
+(
+    sid             varchar(32)  not null
+        constraint authsession_pk
+            primary key,
+    uid             integer      not null,
+    email           varchar(150) not null,
+    nonceHash       varchar(64)  not null,
+    expired         int(10)      not null,
+    absoluteExpired int(10)      not null,
+    createdAt       int(10)      default 0 not null
+);
+
+-- authsession表索引
+create index ixAuthSessionEmail on authsession (email);
+create index ixAuthSessionExpired on authsession (expired);
+
+
+-- 访问令牌签名密钥表, 对应 magic.models.authSession.SigningKey
+create table signingkey
+(
+    kid       varchar(16) not null
+        constraint signingkey_pk
+            primary key,
+    secret    varchar(64) not null,
+    createdAt int(10)     not null
+);
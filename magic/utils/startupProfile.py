@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时分析
+
+phase() 记录 Init_module 各阶段的耗时; importTimeTree() 用 python -X importtime
+在子进程中导入应用, 把输出整理成按累计耗时排序的导入树. 由 start.py --profile-startup 调用.
+"""
+import re
+import sys
+import time
+import subprocess
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+PHASES: list[tuple[str, float]] = []
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@contextmanager
+def phase(name: str):
+    """记录一个初始化阶段的耗时"""
+    startedAt = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES.append((name, time.perf_counter() - startedAt))
+
+
+def formatPhases() -> str:
+    total = sum(elapsed for _, elapsed in PHASES)
+    lines = [f"{'初始化阶段':<32}{'耗时(ms)':>12}"]
+    for name, elapsed in PHASES:
+        lines.append(f"{name:<36}{elapsed * 1000:>12.1f}")
+    lines.append(f"{'合计':<34}{total * 1000:>12.1f}")
+    return "\n".join(lines)
+
+
+@dataclass
+class ImportEntry:
+    module: str
+    depth: int
+    selfUs: int
+    cumulativeUs: int
+
+
+def parseImportTime(output: str) -> list[ImportEntry]:
+    """解析 -X importtime 的 stderr 输出"""
+    entries = []
+    for line in output.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            selfUs, cumulativeUs, indent, module = match.groups()
+            entries.append(ImportEntry(module, max(len(indent) - 1, 0) // 2, int(selfUs), int(cumulativeUs)))
+    return entries
+
+
+def importTimeTree(target: str = "lmoadll_bl", limit: int = 40, minMs: float = 1.0) -> str:
+    """在干净的子进程中导入 target, 返回累计耗时最高的导入树"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True
+    )
+    entries = parseImportTime(result.stderr)
+    if not entries:
+        return f"无法获取导入耗时: {result.stderr.strip()[-500:]}"
+
+    # -X importtime 按后序输出(子模块在前), 反转后即为自顶向下的树
+    lines = [f"{'累计(ms)':>10} {'自身(ms)':>10}  模块"]
+    shown = 0
+    for entry in reversed(entries):
+        if entry.cumulativeUs / 1000 < minMs:
+            continue
+        lines.append(f"{entry.cumulativeUs / 1000:>10.1f} {entry.selfUs / 1000:>10.1f}  {'  ' * entry.depth}{entry.module}")
+        shown += 1
+        if shown >= limit:
+            break
+    top = max(entries, key=lambda e: e.cumulativeUs)
+    lines.append(f"导入 {target} 合计 {top.cumulativeUs / 1000:.1f}ms")
+    return "\n".join(lines)
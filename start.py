@@ -3,11 +3,176 @@
 #
 #@copyright  Copyright (c) 2025 lmoadll_bl team
 #@license  GNU General Public License 3.0
+"""
+生产环境启动器
 
+每个 worker 进程只运行一个事件循环: Init_module 通过 before_serving 在该循环上执行.
+多 worker 时每个进程各自用 SO_REUSEPORT 绑定同一端口, 由内核分配连接;
+不支持 SO_REUSEPORT 的平台退回 hypercorn 自带的多进程模式(父进程共享监听套接字).
+父进程不监管(重启) worker: 任何一个 worker 异常退出时停止其余 worker 并以非零状态退出,
+由 systemd、容器等外部进程管理器重启整个服务.
+
+配置项([server] 段, 环境变量优先):
+    HOST / LMOADLL_HOST: 监听地址, 默认 127.0.0.1
+    PORT / LMOADLL_PORT: 监听端口, 默认 2324
+    WORKERS / WEB_CONCURRENCY: worker 进程数, 默认 1
+    KEEPALIVE / LMOADLL_KEEPALIVE: keep-alive 超时(秒), 默认 5
+    UVLOOP / LMOADLL_UVLOOP: 是否使用 uvloop(需要安装), 默认 false
+
+python start.py --profile-startup 只输出导入耗时树和 Init_module 各阶段耗时, 不监听端口.
+"""
+import os
+import sys
+import signal
+import argparse
+import socket
 import asyncio
-from hypercorn.config import Config
+import multiprocessing
+import multiprocessing.connection
+from hypercorn.config import Config, Sockets
 from hypercorn.asyncio import serve
-from lmoadll_bl import app, init_app
+from magic.utils.TomlConfig import GetConfigToml
+
+
+def load_settings() -> dict:
+    return {
+        "host": GetConfigToml("server", "HOST", "127.0.0.1", env="LMOADLL_HOST"),
+        "port": GetConfigToml("server", "PORT", 2324, env="LMOADLL_PORT"),
+        "workers": max(GetConfigToml("server", "WORKERS", 1, env="WEB_CONCURRENCY"), 1),
+        "keepalive": GetConfigToml("server", "KEEPALIVE", 5.0, env="LMOADLL_KEEPALIVE"),
+        "uvloop": GetConfigToml("server", "UVLOOP", False, env="LMOADLL_UVLOOP"),
+    }
+
+
+def build_config(settings: dict) -> Config:
+    config = Config()
+    config.bind = [f"{settings['host']}:{settings['port']}"]
+    config.keep_alive_timeout = settings["keepalive"]
+    config.accesslog = None  # 访问日志由 ResponseManager 记录
+    config.errorlog = "-"
+    return config
+
+
+def reuseport_sockets(settings: dict) -> Sockets:
+    """创建设置了 SO_REUSEPORT 的监听套接字"""
+    host = settings["host"].strip("[]")
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, settings["port"]))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return Sockets(secure_sockets=[], insecure_sockets=[sock], quic_sockets=[])
+
+
+def install_event_loop_policy(use_uvloop: bool) -> None:
+    if not use_uvloop:
+        return
+    try:
+        import uvloop  # pyright: ignore[reportMissingImports]  # 可选依赖
+    except ImportError:
+        print("未安装 uvloop, 使用默认事件循环", file=sys.stderr)
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+async def _serve(settings: dict, reuse_port: bool) -> None:
+    from lmoadll_bl import app
+
+    config = build_config(settings)
+    if reuse_port:
+        sockets = reuseport_sockets(settings)
+        config.create_sockets = lambda: sockets  # pyright: ignore[reportAttributeAccessIssue]
+
+    shutdown = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, shutdown.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows 不支持 add_signal_handler
+    await serve(app, config, shutdown_trigger=shutdown.wait)  # pyright: ignore[reportArgumentType]
+
+
+def run_worker(settings: dict, reuse_port: bool) -> None:
+    install_event_loop_policy(settings["uvloop"])
+    asyncio.run(_serve(settings, reuse_port))
+
+
+async def _profile_startup() -> None:
+    from magic.utils.startupProfile import importTimeTree, formatPhases
+    print(importTimeTree())
+    print()
+    from lmoadll_bl import app
+    async with app.test_app():  # 触发 before_serving, 即 Init_module
+        pass
+    print(formatPhases())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="lmoadll_bl 生产环境启动器")
+    parser.add_argument("--profile-startup", action="store_true", help="输出启动耗时分析后退出")
+    args = parser.parse_args()
+    if args.profile_startup:
+        asyncio.run(_profile_startup())
+        return
+
+    settings = load_settings()
+    workers = settings["workers"]
+    # 在 fork 之前创建日志文件, 各 worker 写同一个文件而不是各自轮转出新文件
+    from magic.utils.log3 import init_logger
+    init_logger()
+    # 连接池预算按 worker 数分配, 见 magic.utils.db.connection.get_worker_count
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    # 多进程指标: 丢弃上次运行留下的快照
+    from magic.utils.metrics import clearSnapshots, markProcessDead
+    clearSnapshots()
+
+    if workers == 1:
+        run_worker(settings, reuse_port=False)
+        return
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        from hypercorn.run import run
+        config = build_config(settings)
+        config.application_path = "lmoadll_bl:app"
+        config.workers = workers
+        config.worker_class = "uvloop" if settings["uvloop"] else "asyncio"
+        run(config)
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(settings, True), name=f"lmoadll-worker-{i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def _stopAll() -> None:
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM) # pyright: ignore[reportArgumentType]
+
+    signal.signal(signal.SIGINT, lambda signum, frame: _stopAll())
+    signal.signal(signal.SIGTERM, lambda signum, frame: _stopAll())
+
+    running = list(processes)
+    failed = []
+    while running:
+        ready = multiprocessing.connection.wait([process.sentinel for process in running])
+        for process in [p for p in running if p.sentinel in ready]:
+            process.join()
+            running.remove(process)
+            markProcessDead(process.pid) # pyright: ignore[reportArgumentType]
+            if process.exitcode != 0:
+                if not failed:
+                    print(f"{process.name} 异常退出(exitcode={process.exitcode}), 停止其余 worker", file=sys.stderr)
+                    _stopAll()
+                failed.append(process)
+    if failed:
+        sys.exit(1)
+
 
-asyncio.run(init_app())
-asyncio.run(serve(app, Config()))
+if __name__ == "__main__":
+    main()